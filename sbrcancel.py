@@ -1,253 +1,149 @@
-import asyncio
-import argparse
-import re
-from pathlib import Path
-from datetime import datetime
-import pandas as pd
-from playwright.async_api import async_playwright, Error as PWError, Page, BrowserContext
-
-# ====== KONFIGURASI DEFAULT ======
-CDP_ENDPOINT = "http://localhost:9222"  # Jalankan Chrome dengan: chrome.exe --remote-debugging-port=9222
-DEFAULT_EXCEL_PATH = r"C:\kuliah\SBR\Daftar Profiling SBR Kepala Madan.xlsx"
-SHEET_NAME = 0
-
-VERBOSE = True
-def vlog(msg):
-    if VERBOSE:
-        print(msg)
-
-PAUSE_AFTER_EDIT_CLICK_MS = 800
-MAX_WAIT_MS = 8000
-SLOW_MODE = True
-STEP_DELAY_MS = 500
-async def step_pause(page: Page, ms: int | None = None):
-    if SLOW_MODE:
-        await page.wait_for_timeout(ms or STEP_DELAY_MS)
-
-LOG_CSV = "log_sbr_cancel.csv"
-SCREENSHOT_DIR = Path("screenshots_cancel")
-SCREENSHOT_DIR.mkdir(exist_ok=True)
-
-def ts() -> str:
-    return datetime.now().strftime("%Y%m%d_%H%M%S")
-
-def normspace(s) -> str:
-    import re as _re
-    return _re.sub(r"\s+", " ", str(s or "")).strip()
-
-async def safe_screenshot(page: Page, label: str):
-    import re as _re
-    fname = SCREENSHOT_DIR / f"{ts()}_{_re.sub(r'[^a-zA-Z0-9_-]+','-',label)[:60]}.png"
-    try:
-        await page.screenshot(path=str(fname), full_page=True)
-        return str(fname)
-    except Exception:
-        return ""
-
-async def ensure_click(locator, name="element"):
-    await locator.wait_for(state="visible", timeout=MAX_WAIT_MS)
-    await locator.scroll_into_view_if_needed()
-    await locator.click()
-
-async def get_active_directory_page(ctx: BrowserContext) -> Page:
-    pages = ctx.pages
-    if not pages:
-        raise RuntimeError("Tidak ada tab terbuka. Pastikan Chrome sudah pada halaman Direktori Usaha.")
-    return pages[-1]
-
-# ---------- Klik tombol Edit di tabel ----------
-async def click_edit_by_index(page, index0: int) -> bool:
-    table = page.locator("#table_direktori_usaha")
-    await table.wait_for(state="visible", timeout=MAX_WAIT_MS)
-
-    rows = table.locator("tbody > tr")
-    total = await rows.count()
-    if index0 >= total:
-        return False
-
-    row = rows.nth(index0)
-
-    # tombol oranye Edit (kolom aksi)
-    btn = row.locator("css=td >> div.d-flex.align-items-center.col-actions >> a.btn-edit-perusahaan").first
-    if await btn.count() > 0:
-        await ensure_click(btn, name=f"Edit row {index0+1}")
-        return True
-
-    # fallback xpath absolut
-    xpath = f'//*[@id="table_direktori_usaha"]/tbody/tr[{index0+1}]/td[10]/div/a[1]'
-    btn2 = row.locator(f"xpath={xpath}")
-    if await btn2.count() > 0:
-        await ensure_click(btn2, name=f"Edit row {index0+1} (xpath)")
-        return True
-
-    return False
-
-async def click_edit_by_text(page, text: str) -> bool:
-    text = normspace(text)
-    if not text:
-        return False
-
-    table = page.locator("#table_direktori_usaha")
-    await table.wait_for(state="visible", timeout=MAX_WAIT_MS)
-
-    row = table.locator("tbody tr").filter(has_text=re.compile(re.escape(text), re.I)).first
-    try:
-        await row.wait_for(state="visible", timeout=MAX_WAIT_MS)
-    except:
-        return False
-
-    btn = row.locator("css=td >> div.d-flex.align-items-center.col-actions >> a.btn-edit-perusahaan").first
-    if await btn.count() > 0:
-        await ensure_click(btn, name="Edit by text")
-        return True
-
-    btn2 = row.locator("xpath=.//td[div[contains(@class,'col-actions')]]//a[1]")
-    if await btn2.count() > 0:
-        await ensure_click(btn2, name="Edit by text (fallback)")
-        return True
-
-    return False
-
-# ---------- Alur Cancel Submit di tab form ----------
-async def do_cancel_submit(new_page: Page) -> str:
-    print("  Membuka tab form..."); await step_pause(new_page, 300)
-
-    # 1) Klik tombol "Cancel Submit"
-    try:
-        # pakai xpath yang kamu berikan
-        btn = new_page.locator("xpath=//*[@id='cancel-submit-final']/span")
-        if await btn.count() == 0:
-            # fallback berdasarkan teks
-            btn = new_page.locator("button:has-text('Cancel Submit'), a:has-text('Cancel Submit')").first
-        await ensure_click(btn, "Cancel Submit")
-        print("    Klik: Cancel Submit")
-    except Exception as e:
-        print(f"    Gagal klik Cancel Submit: {e}")
-        return "ERROR"
-    await step_pause(new_page)
-
-    # 2) Dialog konfirmasi → "Ya, batalkan!"
-    try:
-        modal = new_page.locator("div.modal.show, div[role='dialog']").filter(has_text=re.compile("Konfirmasi|Konfirmasi", re.I)).first
-        await modal.wait_for(timeout=4000)
-        ya_btn = modal.locator("button:has-text('Ya, batalkan!'), a:has-text('Ya, batalkan!')").first
-        await ya_btn.click(force=True)
-        print("    Konfirmasi: Ya, batalkan!")
-    except Exception as e:
-        print(f"    Gagal klik 'Ya, batalkan!': {e}")
-        return "ERROR"
-    await step_pause(new_page)
-
-    # 3) Dialog Success → "OK"
-    try:
-        for _ in range(20):  # ~5 detik
-            ok_btn = new_page.locator("button:has-text('OK')").first
-            if await ok_btn.count() > 0 and await ok_btn.is_visible():
-                await ok_btn.click(force=True)
-                print("    Success: OK ditekan")
-                await step_pause(new_page, 300)
-                return "OK"
-            await new_page.wait_for_timeout(250)
-        print("    Tidak menemukan dialog Success; diasumsikan OK")
-        return "OK"
-    except Exception as e:
-        print(f"    Gagal menutup dialog success: {e}")
-        return "ERROR"
-
-# ---------- Main runner ----------
-async def run(args):
-    # Baca Excel (dipakai untuk iterasi & match_by)
-    df = pd.read_excel(args.excel, sheet_name=SHEET_NAME)
-
-    # Validasi kolom untuk match_by
-    if args.match_by == "idsbr" and "IDSBR" not in df.columns:
-        raise RuntimeError("Match by 'idsbr' dipilih tapi kolom 'IDSBR' tidak ada di Excel")
-    if args.match_by == "name" and "Nama" not in df.columns:
-        raise RuntimeError("Match by 'name' dipilih tapi kolom 'Nama' tidak ada di Excel")
-
-    start_idx = 0 if args.start is None else max(args.start - 1, 0)
-    end_idx = len(df) if args.end is None else min(args.end, len(df))
-
-    logs = []
-
-    async with async_playwright() as p:
-        browser = await p.chromium.connect_over_cdp(CDP_ENDPOINT)
-        context = browser.contexts[0]
-        page = await get_active_directory_page(context)
-
-        for i in range(start_idx, end_idx):
-            row = df.iloc[i]
-            print(f"\n=== Baris {i+1} ===")
-
-            # 0) Klik Edit di tabel
-            try:
-                clicked = False
-                if args.match_by == "index":
-                    clicked = await click_edit_by_index(page, i - start_idx)
-                elif args.match_by == "idsbr":
-                    clicked = await click_edit_by_text(page, normspace(row.get("IDSBR")))
-                elif args.match_by == "name":
-                    clicked = await click_edit_by_text(page, normspace(row.get("Nama")))
-
-                if not clicked:
-                    shot = await safe_screenshot(page, f"gagal_klik_edit_baris_{i+1}")
-                    print(f"  Tidak bisa klik Edit (lihat {shot})")
-                    logs.append({"row_index": i+1, "result": "ERROR", "note": "Gagal klik Edit", "screenshot": shot})
-                    break
-                print("  Klik Edit berhasil")
-            except Exception as e:
-                shot = await safe_screenshot(page, f"exception_click_edit_baris_{i+1}")
-                logs.append({"row_index": i+1, "result": "ERROR", "note": f"Exception klik Edit: {e}", "screenshot": shot})
-                break
-
-            # 0a) Popup "Ya, edit!"
-            try:
-                ya_edit = page.get_by_role("button", name=re.compile(r"Ya,\s*edit!?$", re.I))
-                if await ya_edit.count() > 0:
-                    await ensure_click(ya_edit, "Ya, edit!")
-                    print("  Konfirmasi awal: Ya, edit!")
-            except PWError:
-                pass
-            await page.wait_for_timeout(PAUSE_AFTER_EDIT_CLICK_MS)
-
-            # 1) Ambil tab baru (form)
-            try:
-                new_page = await context.wait_for_event("page", timeout=MAX_WAIT_MS)
-            except PWError as e:
-                shot = await safe_screenshot(page, f"no_new_tab_baris_{i+1}")
-                logs.append({"row_index": i+1, "result": "ERROR", "note": f"Tidak ada tab form: {e}", "screenshot": shot})
-                break
-
-            await new_page.bring_to_front()
-
-            # 2) Jalankan alur Cancel Submit
-            result = await do_cancel_submit(new_page)
-
-            # 3) Tutup tab form & kembali
-            try:
-                await new_page.close()
-            except PWError:
-                pass
-            await page.bring_to_front()
-            print("  Tab form ditutup, kembali ke Direktori.")
-
-            logs.append({"row_index": i+1, "result": result, "note": "", "screenshot": ""})
-            if result != "OK":
-                break
-
-    # Simpan log
-    pd.DataFrame(logs).to_csv(LOG_CSV, index=False)
-    print(f"\nSelesai. Log tersimpan di: {LOG_CSV}")
-
-def parse_args():
-    ap = argparse.ArgumentParser(description="SBR Cancel Submit (attach via CDP)")
-    ap.add_argument("--excel", default=DEFAULT_EXCEL_PATH, help="Path ke file Excel")
-    ap.add_argument("--start", type=int, default=None, help="Mulai dari baris ke- (1-indexed)")
-    ap.add_argument("--end", type=int, default=None, help="Sampai baris ke- (inklusif; default = semua)")
-    ap.add_argument("--match-by", choices=["index", "idsbr", "name"], default="index",
-                   help="Cara memilih tombol Edit: index (default), idsbr, atau name")
-    return ap.parse_args()
-
-if __name__ == "__main__":
-    args = parse_args()
-    asyncio.run(run(args))
\ No newline at end of file
+import asyncio
+import argparse
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from playwright.async_api import Error as PWError, Page
+from sbrcore import PROFILER, ExcelRow, Governor, iter_rows, log_event, normspace
+from sbrengine import (MAX_WAIT_MS, RowAction, RunState, add_common_args, check_common_args, export_state,
+                       load_rows, run_pipeline, safe_screenshot, slow_pause)
+from sbrhttp import classify_response, response_detail
+
+# ====== KONFIGURASI DEFAULT ======
+# Chrome dijalankan dengan: chrome.exe --remote-debugging-port=9222 (lihat --cdp)
+
+CANCEL_URL_RE = re.compile(r"cancel", re.I)  # endpoint XHR Cancel Submit
+LOG_CSV = "log_sbr_cancel.csv"
+RESULT_CSV = "hasil_cancel_sbr.csv"     # hasil akhir per IDSBR
+SCREENSHOT_DIR = Path("screenshots_cancel")
+
+
+async def ensure_click(locator, name="element"):
+    await locator.wait_for(state="visible", timeout=MAX_WAIT_MS)
+    await locator.scroll_into_view_if_needed()
+    await locator.click()
+
+# ---------- Alur Cancel Submit di tab form ----------
+def is_cancel_response(resp) -> bool:
+    return resp.request.method == "POST" and bool(CANCEL_URL_RE.search(resp.url))
+
+
+async def do_cancel_submit(new_page: Page, governor: Governor | None = None) -> tuple[str, str]:
+    """
+    Klik Cancel Submit → "Ya, batalkan!" lalu tentukan hasil dari respons XHR cancel (status + body).
+    Hasil: (OK | NO_CANCEL_BUTTON | NO_CONFIRM | NO_CANCEL_RESPONSE | SESSION | HTTP_xxx | NO_SUCCESS_SIGNAL, detail)
+    NO_CANCEL_RESPONSE = "Ya, batalkan!" sudah diklik tapi respons tidak terlihat; cancel mungkin sudah
+    tersimpan, jadi baris ini tidak dicoba ulang.
+    Bila OK, latensi klik "Ya, batalkan!" → respons dilaporkan ke `governor`.
+    """
+    print("  Membuka tab form..."); await slow_pause(new_page, 300)
+
+    # 1) Klik tombol "Cancel Submit"
+    try:
+        # pakai xpath yang kamu berikan
+        btn = new_page.locator("xpath=//*[@id='cancel-submit-final']/span")
+        if await btn.count() == 0:
+            # fallback berdasarkan teks
+            btn = new_page.locator("button:has-text('Cancel Submit'), a:has-text('Cancel Submit')").first
+        await ensure_click(btn, "Cancel Submit")
+        print("    Klik: Cancel Submit")
+    except Exception as e:
+        print(f"    Gagal klik Cancel Submit: {e}")
+        return "NO_CANCEL_BUTTON", normspace(e)[:200]
+    await slow_pause(new_page)
+
+    # 2) Dialog konfirmasi → "Ya, batalkan!" sekaligus tangkap respons XHR cancel
+    clicked = False
+    try:
+        modal = new_page.locator("div.modal.show, div[role='dialog']").filter(has_text=re.compile("Konfirmasi|Konfirmasi", re.I)).first
+        await modal.wait_for(timeout=4000)
+        ya_btn = modal.locator("button:has-text('Ya, batalkan!'), a:has-text('Ya, batalkan!')").first
+        with PROFILER.span("CONFIRM"):
+            async with new_page.expect_response(is_cancel_response, timeout=MAX_WAIT_MS) as resp_info:
+                t_confirm = time.perf_counter()
+                await ya_btn.click(force=True)
+                clicked = True
+                print("    Konfirmasi: Ya, batalkan!")
+            resp = await resp_info.value
+            latency = time.perf_counter() - t_confirm
+    except Exception as e:
+        if not clicked:
+            print(f"    Gagal klik 'Ya, batalkan!': {e}")
+            return "NO_CONFIRM", normspace(e)[:200]
+        print("    Respons cancel dari server tidak terdeteksi (cancel mungkin sudah tersimpan, periksa manual)")
+        return "NO_CANCEL_RESPONSE", normspace(e)[:200]
+
+    try:
+        text = await resp.text()
+    except PWError:
+        text = ""
+    outcome, detail = classify_response(resp.status, text), response_detail(text)
+    print(f"    Respons cancel: HTTP {resp.status} -> {outcome}" + (f" ({detail})" if detail else ""))
+    if outcome == "OK" and governor:
+        governor.success(latency)
+
+    # 3) Dialog Success → "OK" bila sudah tampil; tab langsung ditutup, jadi tidak perlu ditunggu
+    try:
+        ok_btn = new_page.locator("button:has-text('OK')").first
+        if await ok_btn.is_visible():
+            await ok_btn.click(force=True, timeout=1000)
+    except PWError:
+        pass
+    return outcome, detail
+
+
+# ---------- Aksi Cancel Submit untuk pipeline sbrengine ----------
+class CancelAction(RowAction):
+    name = "cancel"
+    log_csv = LOG_CSV
+    screenshot_dir = SCREENSHOT_DIR
+    check_lock = False
+    # tombol/konfirmasi yang belum muncul biasanya karena form lambat dimuat → layak dicoba ulang
+    retry_codes = RowAction.retry_codes + ("NO_CANCEL_BUTTON", "NO_CONFIRM")
+    # tombol Edit yang gagal diklik cukup menggagalkan baris itu; batal massal tetap lanjut
+    fatal_codes = ("SESSION",)
+
+    async def act(self, state: RunState, row: ExcelRow, form: Page) -> tuple[str, str]:
+        with PROFILER.span("CANCEL_SUBMIT"):
+            code, detail = await do_cancel_submit(form, state.governor)
+        if code == "OK":
+            log_event(state.log, row.index+1, "OK", "CANCEL_SUBMIT", "Submit dibatalkan", idsbr=row.idsbr)
+        else:
+            shot = await safe_screenshot(form, f"cancel_issue_baris_{row.index+1}_{code}", self.screenshot_dir)
+            log_event(state.log, row.index+1, "ERROR", "CANCEL_SUBMIT", f"{code} {detail}".strip(), shot,
+                      idsbr=row.idsbr)
+        return code, detail
+
+
+# ---------- Main runner ----------
+async def run(args):
+    if args.export_state:
+        await export_state(args)
+        return
+
+    # Excel dipilih sama seperti sbrfill.py (--excel, atau satu-satunya *.xlsx di folder script)
+    action = CancelAction()
+    df, start_idx, end_idx = load_rows(action, args, Path(__file__).resolve().parent)
+    rows = list(iter_rows(df, start_idx, end_idx))
+
+    results, sink = await run_pipeline(action, args, rows, start_idx)
+
+    counts = Counter(results.values())
+    c = sink.counts
+    print("\nHasil per baris: " + (", ".join(f"{k}={v}" for k, v in counts.most_common()) or "-"))
+    print(f"Selesai. OK={c['OK']} WARN={c['WARN']} ERROR={c['ERROR']}. Log tersimpan di: {LOG_CSV}")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="SBR Cancel Submit (attach via CDP)")
+    add_common_args(ap)
+    # batal submit massal: lanjut walau ada baris gagal, coba ulang gangguan sementara, catat hasil per IDSBR
+    ap.set_defaults(retries=2, result_csv=RESULT_CSV, lock_retry_max=0)
+    args = ap.parse_args()
+    check_common_args(ap, args)
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(run(args))
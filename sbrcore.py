@@ -0,0 +1,922 @@
+import asyncio
+import csv
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import astuple, dataclass, field
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+from playwright.async_api import BrowserContext, Page, Route
+
+# ====== KOMPONEN BERSAMA sbrfill.py & sbrcancel.py ======
+
+TABLE_SELECTOR = "#table_direktori_usaha"
+EDIT_BTN_SELECTOR = "td div.col-actions a.btn-edit-perusahaan"
+
+
+def ts() -> str:
+    return datetime.now().strftime("%Y%m%d_%H%M%S")
+
+
+def normspace(s) -> str:
+    if s is None or (isinstance(s, float) and pd.isna(s)) or pd.isna(s):
+        return ""
+    return re.sub(r"\s+", " ", str(s)).strip()
+
+
+def norm_phone_str(v) -> str:
+    if v is None or (isinstance(v, float) and pd.isna(v)) or pd.isna(v):
+        return ""
+    return "".join(re.findall(r"\d", str(v)))  # hanya digit
+
+
+def normfloat_str(s: str) -> str:
+    s = normspace(s)
+    if not s:
+        return ""
+    s = s.replace(",", ".")
+    m = re.search(r"-?\d+(?:\.\d+)?", s)
+    return m.group(0) if m else ""
+
+
+def first_line(s: str) -> str:
+    return normspace((s or "").strip().split("\n", 1)[0])
+
+
+# ---------- Baca Excel ----------
+
+STATUS_ID_MAP = {
+    "Aktif": "kondisi_aktif",
+    "Tutup Sementara": "kondisi_tutup_sementara",
+    "Belum Beroperasi/Berproduksi": "kondisi_belum_beroperasi_berproduksi",
+    "Tutup": "kondisi_tutup",
+    "Alih Usaha": "kondisi_alih_usaha",
+    "Tidak Ditemukan": "kondisi_tidak_ditemukan",
+    "Aktif Pindah": "kondisi_aktif_pindah",
+    "Aktif Nonrespon": "kondisi_aktif_nonrespon",
+    "Duplikat": "kondisi_duplikat",
+    "Salah Kode Wilayah": "kondisi_salah_kode_wilayah",
+}
+
+# Halaman kunci: teks yang pasti hanya muncul saat form dipegang user lain / tidak boleh diedit.
+LOCK_TEXT_RE = r"sedang\s+diedit\s+oleh\s+user\s+lain|sedang\s+edit|tidak\s+bisa\s+melakukan\s+edit|Not\s+Authorized"
+# Teks lemah ("Profiling Info", "Back to Home") juga ada di halaman normal; dipakai hanya bila
+# halaman sudah selesai dimuat tanpa satu pun elemen form.
+LOCK_WEAK_RE = r"Profiling\s+Info|Back\s+to\s+Home"
+
+# batas kasar koordinat wilayah Indonesia (menangkap lat/lon tertukar atau salah tanda)
+LAT_RANGE = (-11.5, 6.5)
+LON_RANGE = (94.5, 141.5)
+EMAIL_RE = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+
+# kolom Excel yang dipakai program → nama field ExcelRow; kolom lain tidak dibaca sama sekali
+EXCEL_COLUMNS = {
+    "IDSBR": "idsbr",
+    "Nama": "nama",
+    "Status": "status",
+    "Nomor Telepon": "phone",
+    "Email": "email",
+    "Latitude": "lat",
+    "Longitude": "lon",
+    "Sumber": "sumber",
+    "Catatan": "catatan",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class ExcelRow:
+    index: int              # posisi baris data di sheet (0-based)
+    idsbr: str = ""
+    nama: str = ""
+    status: str = ""
+    phone: str = ""
+    email: str = ""
+    lat: str = ""
+    lon: str = ""
+    sumber: str = ""
+    catatan: str = ""
+
+    @property
+    def hash(self) -> str:
+        return row_hash(astuple(self)[1:])
+
+
+def excel_engine() -> str | None:
+    """calamine (Rust, jauh lebih cepat) bila python-calamine terpasang; selain itu default pandas (openpyxl read-only)."""
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return None
+    return "calamine"
+
+
+def load_sheet(path, sheet_index=0, columns=EXCEL_COLUMNS) -> pd.DataFrame:
+    """Baca hanya kolom yang dipakai (usecols), semua sebagai string."""
+    wanted = set(columns)
+    kwargs = dict(sheet_name=sheet_index, dtype=str, usecols=lambda c: normspace(c) in wanted)
+    engine = excel_engine()
+    try:
+        df = pd.read_excel(path, engine=engine, **kwargs)
+    except ValueError:
+        if engine is None:
+            raise
+        df = pd.read_excel(path, **kwargs)  # pandas lama belum mengenal engine calamine
+    df.columns = [normspace(c) for c in df.columns]
+    return df
+
+
+# ---------- Cache Excel (.sbrcache) ----------
+
+CACHE_DIR_NAME = ".sbrcache"
+CACHE_VERSION = 3   # naikkan bila isi/normalisasi cache berubah
+
+
+def normalize_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Versi vektor (per kolom, bukan per sel) dari normspace / norm_phone_str / normfloat_str,
+    ditambah kolom `_reject` berisi alasan baris ditolak (kosong = baris valid).
+    """
+    raw = pd.DataFrame(
+        {c: df[c].fillna("").astype(str).str.replace(r"\s+", " ", regex=True).str.strip() for c in df.columns},
+        index=df.index,
+    )
+    out = raw.copy()
+    if "Status" in out.columns:
+        # label ditulis ulang dalam bentuk kanonis agar lookup STATUS_ID_MAP (peka huruf besar) cocok
+        canon = {k.lower(): k for k in STATUS_ID_MAP}
+        out["Status"] = raw["Status"].map(lambda v: canon.get(v.lower(), v))
+    if "Nomor Telepon" in out.columns:
+        out["Nomor Telepon"] = raw["Nomor Telepon"].str.replace(r"\D", "", regex=True)
+    for col in ("Latitude", "Longitude"):
+        if col in out.columns:
+            out[col] = (raw[col].str.replace(",", ".", regex=False)
+                        .str.extract(r"(-?\d+(?:\.\d+)?)", expand=False).fillna(""))
+    out["_reject"] = validate_sheet(raw, out)
+    return out.reset_index(drop=True)
+
+
+def validate_sheet(raw: pd.DataFrame, norm: pd.DataFrame) -> pd.Series:
+    """Alasan penolakan per baris (vektor): Status terisi tapi di luar STATUS_ID_MAP, lat/lon rusak/di luar wilayah, email tidak valid."""
+    empty = pd.Series("", index=norm.index)
+    reasons = []
+
+    if "Status" in norm.columns:
+        # Status kosong = radio status tidak diubah (sama seperti field lain), jadi tidak ditolak
+        st = norm["Status"]
+        known = st.isin(set(STATUS_ID_MAP))
+        reasons.append(empty.mask((st != "") & ~known, "Status tidak dikenal: " + st))
+
+    for col, (lo, hi) in (("Latitude", LAT_RANGE), ("Longitude", LON_RANGE)):
+        if col not in norm.columns:
+            continue
+        val = pd.to_numeric(norm[col], errors="coerce")
+        reasons.append(empty.mask((raw[col] != "") & val.isna(), f"{col} tidak valid: " + raw[col]))
+        reasons.append(empty.mask(val.notna() & ((val < lo) | (val > hi)), f"{col} di luar wilayah: " + norm[col]))
+
+    if "Email" in norm.columns:
+        em = norm["Email"]
+        reasons.append(empty.mask((em != "") & ~em.str.match(EMAIL_RE), "Email tidak valid: " + em))
+
+    result = empty
+    for r in reasons:
+        result = result.str.cat(r, sep="; ")
+    return result.str.replace(r"(; )+", "; ", regex=True).str.strip("; ")
+
+
+def rejected_rows(df: pd.DataFrame, start: int = 0, end: int | None = None) -> pd.DataFrame:
+    """Laporan baris yang ditolak validasi (row_index 1-based seperti log)."""
+    part = df.iloc[start:end]
+    if "_reject" not in part.columns:
+        return pd.DataFrame(columns=["row_index", "IDSBR", "Nama", "reason"])
+    bad = part[part["_reject"] != ""]
+    return pd.DataFrame({
+        "row_index": bad.index + 1,
+        "IDSBR": bad["IDSBR"] if "IDSBR" in bad.columns else "",
+        "Nama": bad["Nama"] if "Nama" in bad.columns else "",
+        "reason": bad["_reject"],
+    })
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cached_sha(path: Path, cache_dir: Path) -> str:
+    """sha256 file Excel; dihitung ulang hanya bila mtime/ukuran berubah (dicatat di index.json)."""
+    index_path = cache_dir / "index.json"
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        index = {}
+    st = path.stat()
+    ent = index.get(str(path))
+    if ent and ent.get("mtime_ns") == st.st_mtime_ns and ent.get("size") == st.st_size:
+        return ent["sha"]
+    sha = file_sha256(path)
+    index[str(path)] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha": sha}
+    index_path.write_text(json.dumps(index, indent=1), encoding="utf-8")
+    return sha
+
+
+def _cache_format() -> str:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "csv"
+    return "parquet"
+
+
+def _read_cache(path: Path, fmt: str) -> pd.DataFrame:
+    # hanya format data (tanpa pickle): folder cache bisa ikut tersalin dari folder bersama/unduhan
+    if fmt == "parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_filter=False, encoding="utf-8")
+
+
+def _write_cache(df: pd.DataFrame, path: Path, fmt: str) -> None:
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8")
+
+
+def load_sheet_cached(path, sheet_index=0, use_cache: bool = True) -> pd.DataFrame:
+    """
+    load_sheet + normalize_sheet, disimpan di <folder Excel>/.sbrcache/<sha>.parquet
+    (atau .csv bila pyarrow tidak ada; semua kolom sudah string). Run berikutnya dengan file yang
+    sama langsung memakai cache.
+    """
+    path = Path(path).resolve()
+    if not use_cache:
+        return normalize_sheet(load_sheet(path, sheet_index))
+
+    cache_dir = path.parent / CACHE_DIR_NAME
+    fmt = _cache_format()
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        cached = cache_dir / f"{_cached_sha(path, cache_dir)[:32]}_s{sheet_index}_v{CACHE_VERSION}.{fmt}"
+        if cached.exists():
+            return _read_cache(cached, fmt)
+    except Exception as e:
+        print(f"[WARN] Cache Excel tidak bisa dipakai ({e}); membaca ulang file.")
+        cached = None
+
+    df = normalize_sheet(load_sheet(path, sheet_index))
+    if cached is not None:
+        try:
+            tmp = cached.with_suffix(".tmp")
+            _write_cache(df, tmp, fmt)
+            os.replace(tmp, cached)
+        except Exception as e:
+            print(f"[WARN] Gagal menyimpan cache Excel: {e}")
+    return df
+
+
+def iter_rows(df: pd.DataFrame, start: int = 0, end: int | None = None):
+    """Generator ExcelRow (nilai sudah dirapikan spasinya) untuk baris start..end-1."""
+    cols = [(df.columns.get_loc(c), f) for c, f in EXCEL_COLUMNS.items() if c in df.columns]
+    for i, values in enumerate(df.iloc[start:end].itertuples(index=False, name=None), start=start):
+        yield ExcelRow(index=i, **{f: normspace(values[k]) for k, f in cols})
+
+
+# ---------- Indeks tabel Direktori Usaha ----------
+
+@dataclass
+class DirectoryRow:
+    pos: int                    # urutan <tr> pada halaman tabel yang sedang tampil (0-based)
+    idsbr: str
+    nama: str
+    cells: list[str] = field(default_factory=list)
+    keys: list[str] = field(default_factory=list)   # teks sel (lowercase) untuk pencocokan persis
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.cells)
+
+
+class DirectoryIndex:
+    """
+    Snapshot isi tabel direktori: satu page.evaluate per halaman tabel, lalu pencarian
+    IDSBR/Nama dilakukan di Python lewat dict (tanpa scan teks per baris di browser).
+    """
+
+    def __init__(self, page: Page, timeout_ms: int = 5000):
+        self.page = page
+        self.timeout_ms = timeout_ms
+        self.rows: list[DirectoryRow] = []
+        self._by_key: dict[str, DirectoryRow] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    async def refresh(self) -> int:
+        await self.page.locator(TABLE_SELECTOR).wait_for(state="visible", timeout=self.timeout_ms)
+        snap = await self.page.evaluate("""
+            (sel) => {
+                const table = document.querySelector(sel);
+                if (!table) return { headers: [], rows: [] };
+                const headers = [...table.querySelectorAll('thead th')].map(th => (th.innerText || '').trim());
+                const rows = [...table.querySelectorAll('tbody > tr')].map((tr, pos) => ({
+                    pos,
+                    cells: [...tr.cells].map(td => (td.innerText || '').trim()),
+                    editable: !!tr.querySelector('a.btn-edit-perusahaan'),
+                }));
+                return { headers, rows };
+            }
+        """, TABLE_SELECTOR)
+
+        headers = [normspace(h).lower() for h in snap["headers"]]
+        col_id = next((k for k, h in enumerate(headers) if "idsbr" in h), None)
+        col_nama = next((k for k, h in enumerate(headers) if h.startswith("nama")), None)
+
+        self.rows, self._by_key = [], {}
+        for r in snap["rows"]:
+            if not r["editable"]:
+                continue  # baris "No data available" dsb.
+            cells = [normspace(c) for c in r["cells"]]
+            # kunci: teks utuh tiap sel + tiap baris teks di dalam sel (mis. IDSBR di atas badge)
+            keys = list(dict.fromkeys(
+                k for raw in r["cells"] for k in (normspace(p).lower() for p in [raw, *raw.splitlines()]) if k
+            ))
+            row = DirectoryRow(
+                pos=r["pos"],
+                idsbr=first_line(r["cells"][col_id]) if col_id is not None and col_id < len(cells) else "",
+                nama=cells[col_nama] if col_nama is not None and col_nama < len(cells) else "",
+                cells=cells,
+                keys=keys,
+            )
+            self.rows.append(row)
+            for key in keys:
+                self._by_key.setdefault(key, row)
+        return len(self.rows)
+
+    def find(self, text: str) -> DirectoryRow | None:
+        """Cari baris berdasarkan IDSBR/Nama: cocok persis dulu (O(1)), lalu substring seperti has_text."""
+        key = normspace(text).lower()
+        if not key:
+            return None
+        row = self._by_key.get(key)
+        if row is not None:
+            return row
+        return next((r for r in self.rows if key in r.text.lower()), None)
+
+    def at(self, index0: int) -> DirectoryRow | None:
+        return self.rows[index0] if 0 <= index0 < len(self.rows) else None
+
+    async def click_edit(self, row: DirectoryRow, expect_text: str = "") -> bool:
+        """
+        Klik tombol Edit pada baris hasil snapshot. Bila tabel sudah berubah sejak snapshot
+        (baris pada posisi itu tidak lagi memuat expect_text), kembalikan False.
+        """
+        tr = self.page.locator(f"{TABLE_SELECTOR} tbody > tr").nth(row.pos)
+        if expect_text:
+            tr = tr.filter(has_text=re.compile(re.escape(normspace(expect_text)), re.I))
+        btn = tr.locator(EDIT_BTN_SELECTOR).first
+        if await btn.count() == 0:
+            btn = tr.locator("xpath=.//td[div[contains(@class,'col-actions')]]//a[1]").first
+            if await btn.count() == 0:
+                return False
+
+        for _ in range(3):
+            try:
+                await btn.scroll_into_view_if_needed()
+                await btn.click(timeout=self.timeout_ms)
+                return True
+            except Exception:
+                await self.page.evaluate("() => document.querySelectorAll('.tooltip,.modal-backdrop').forEach(e=>e.remove())")
+                await self.page.wait_for_timeout(150)
+        return False
+
+
+# ---------- Kursor pagination tabel (DataTables) ----------
+
+class DirectoryCursor:
+    """
+    Menelusuri seluruh halaman tabel direktori: panjang halaman dinaikkan ke opsi terbesar,
+    lalu tombol Next diklik sampai habis. Index di-refresh sekali per halaman.
+    `offset` = urutan global baris pertama pada halaman yang sedang tampil.
+    """
+
+    def __init__(self, index: DirectoryIndex):
+        self.index = index
+        self.page = index.page
+        self.offset = 0
+        self.position = 0      # urutan global baris terakhir yang di-yield oleh rows()
+
+    async def _signature(self) -> str:
+        return await self.page.evaluate("""
+            (sel) => {
+                const info = document.querySelector(sel + '_info');
+                const tr = document.querySelector(sel + ' tbody > tr');
+                return (info ? info.innerText : '') + '|' + (tr ? tr.innerText : '');
+            }
+        """, TABLE_SELECTOR)
+
+    async def _wait_redraw(self, before: str) -> None:
+        await self.page.wait_for_function("""
+            ([sel, before]) => {
+                const proc = document.querySelector(sel + '_processing');
+                if (proc && getComputedStyle(proc).display !== 'none') return false;
+                const info = document.querySelector(sel + '_info');
+                const tr = document.querySelector(sel + ' tbody > tr');
+                return ((info ? info.innerText : '') + '|' + (tr ? tr.innerText : '')) !== before;
+            }
+        """, arg=[TABLE_SELECTOR, before], timeout=self.index.timeout_ms * 3)
+
+    async def rewind(self) -> None:
+        """Kembali ke halaman pertama lewat API DataTables (bila jQuery tersedia)."""
+        before = await self._signature()
+        moved = await self.page.evaluate("""
+            (sel) => {
+                const $ = window.jQuery;
+                if (!$ || !$.fn || !$.fn.dataTable) return false;
+                const dt = $(sel).DataTable();
+                if (dt.page() === 0) return false;
+                dt.page('first').draw('page');
+                return true;
+            }
+        """, TABLE_SELECTOR)
+        if moved:
+            await self._wait_redraw(before)
+
+    async def maximize_page_length(self) -> None:
+        """Pilih opsi 'Show N entries' terbesar (-1 = All) agar jumlah halaman minimal."""
+        sel = self.page.locator(f"select[name='{TABLE_SELECTOR[1:]}_length']").first
+        if await sel.count() == 0:
+            return
+        values = await sel.locator("option").evaluate_all("os => os.map(o => o.value)")
+        sizes = [int(v) for v in values if re.fullmatch(r"-?\d+", v)]
+        if not sizes:
+            return
+        best = -1 if -1 in sizes else max(sizes)
+        current = await sel.input_value()
+        if current == str(best):
+            return
+        # tidak perlu redraw bila semua entri sudah muat di halaman sekarang
+        info = await self.page.locator(f"{TABLE_SELECTOR}_info").all_inner_texts()
+        nums = [int(n) for n in re.findall(r"\d+", " ".join(info).replace(".", "").replace(",", ""))]
+        if len(nums) >= 3 and re.fullmatch(r"\d+", current) and nums[2] <= int(current):
+            return
+        before = await self._signature()
+        await sel.select_option(str(best))
+        await self._wait_redraw(before)
+
+    async def next_page(self) -> bool:
+        nxt = self.page.locator(f"{TABLE_SELECTOR}_next:not(.disabled)").first
+        if await nxt.count() == 0:
+            return False
+        before = await self._signature()
+        await nxt.click()
+        await self._wait_redraw(before)
+        return True
+
+    async def pages(self):
+        """Async generator: per halaman tabel, refresh index lalu yield offset halaman itu."""
+        await self.rewind()
+        await self.maximize_page_length()
+        self.offset = 0
+        while True:
+            await self.index.refresh()
+            yield self.offset
+            self.offset += len(self.index)
+            if not await self.next_page():
+                return
+
+    async def rows(self):
+        """Async generator: stream pasangan (IDSBR, DirectoryRow) dari semua halaman, satu per satu."""
+        async for offset in self.pages():
+            for n, drow in enumerate(list(self.index.rows)):
+                self.position = offset + n
+                yield drow.idsbr, drow
+
+
+def match_pending(drow: DirectoryRow, pending: dict) -> str | None:
+    """Kembalikan kunci di `pending` (lowercase) yang cocok persis dengan salah satu sel baris."""
+    return next((k for k in drow.keys if k in pending), None)
+
+
+# ---------- Jurnal checkpoint (resume) ----------
+
+def row_hash(values) -> str:
+    """Hash pendek isi baris Excel; bila baris diubah di Excel, hash berubah dan baris diproses ulang."""
+    norm = [normspace(v) for v in values]
+    return hashlib.sha1(json.dumps(norm, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+class Journal:
+    """
+    Jurnal append-only (JSONL, flush + fsync per entri) berisi baris yang sudah selesai.
+    Kunci = IDSBR + hash baris Excel. Baris terakhir yang terpotong (crash saat menulis) diabaikan.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.done: set[tuple[str, str]] = set()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        e = json.loads(line)
+                    except ValueError:
+                        continue
+                    if e.get("status") == "done":
+                        self.done.add((e.get("idsbr", ""), e.get("hash", "")))
+        torn = False
+        if self.path.exists() and self.path.stat().st_size:
+            with open(self.path, "rb") as fh:
+                fh.seek(-1, os.SEEK_END)
+                torn = fh.read(1) != b"\n"
+        self._fh = open(self.path, "a", encoding="utf-8")
+        if torn:
+            self._fh.write("\n")  # tutup baris terpotong agar entri baru tidak ikut rusak
+
+    def is_done(self, idsbr: str, rhash: str) -> bool:
+        return (idsbr, rhash) in self.done
+
+    def record(self, idsbr: str, rhash: str, row_index: int, status: str = "done", **extra) -> None:
+        entry = {"ts": datetime.now().isoformat(timespec="seconds"), "idsbr": idsbr, "hash": rhash,
+                 "row_index": row_index, "status": status, **extra}
+        self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        if status == "done":
+            self.done.add((idsbr, rhash))
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+# ---------- Log streaming (CSV) ----------
+
+LOG_FIELDS = ("ts", "row_index", "idsbr", "level", "stage", "note", "screenshot")
+
+
+class LogSink:
+    """
+    Log CSV dengan skema tetap LOG_FIELDS, ditulis line-buffered: tiap event langsung ada di disk
+    (bisa dipantau dengan `tail -f`) dan memori hanya menyimpan hitungan per level.
+    File lama dengan skema sama dilanjutkan (append); skema berbeda ditimpa.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.counts: Counter = Counter()
+        append = False
+        if self.path.exists():
+            with open(self.path, newline="", encoding="utf-8") as fh:
+                append = tuple(next(csv.reader(fh), [])) == LOG_FIELDS
+        self._fh = open(self.path, "a" if append else "w", newline="", encoding="utf-8", buffering=1)
+        self._writer = csv.DictWriter(self._fh, fieldnames=LOG_FIELDS)
+        if not append:
+            self._writer.writeheader()
+
+    def write(self, **entry) -> None:
+        self._writer.writerow({k: entry.get(k, "") for k in LOG_FIELDS})
+        self.counts[entry.get("level", "")] += 1
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def log_event(sink: LogSink, row_idx: int, level: str, stage: str, note: str, screenshot: str = "", idsbr: str = ""):
+    sink.write(
+        ts=ts(),
+        row_index=row_idx,
+        idsbr=idsbr,
+        level=level,        # "OK" | "WARN" | "ERROR"
+        stage=stage,        # e.g. CLICK_EDIT / OPEN_TAB / FILL / SUBMIT / CONFIRM_SUBMIT
+        note=note,
+        screenshot=screenshot,
+    )
+    tag = "!" if level != "OK" else "-"
+    print(f"  {tag} [{level}] {stage}: {note}" + (f" (ss: {screenshot})" if screenshot else ""))
+
+
+# ---------- Riwayat log (plan & estimasi waktu) ----------
+
+def read_log_history(path) -> list[dict]:
+    """Seluruh event dari log CSV run sebelumnya (skema lama maupun LOG_FIELDS); [] bila belum ada."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, newline="", encoding="utf-8") as fh:
+        return list(csv.DictReader(fh))
+
+
+def last_stage_by_row(history: list[dict]) -> dict[str, str]:
+    """Stage terakhir per baris, dikunci dengan IDSBR (atau row_index untuk log lama tanpa IDSBR)."""
+    last = {}
+    for e in history:
+        key = e.get("idsbr") or f"#{e.get('row_index', '')}"
+        last[key] = e.get("stage", "")
+    return last
+
+
+def seconds_per_row(history: list[dict], gap_cap_s: float = 600.0) -> float | None:
+    """
+    Rata-rata jeda antar ROW_DONE berurutan = throughput nyata run sebelumnya (sudah termasuk
+    efek --workers). Jeda lebih dari gap_cap_s dianggap batas antar-run dan tidak dihitung.
+    """
+    times = []
+    for e in history:
+        if e.get("stage") == "ROW_DONE":
+            try:
+                times.append(datetime.strptime(e.get("ts", ""), "%Y%m%d_%H%M%S"))
+            except ValueError:
+                continue
+    times.sort()
+    gaps = [(b - a).total_seconds() for a, b in zip(times, times[1:])]
+    gaps = [g for g in gaps if g <= gap_cap_s]
+    return (sum(gaps) / len(gaps)) or None if gaps else None
+
+
+# ---------- Profil waktu per tahap ----------
+
+@dataclass(slots=True)
+class Span:
+    stage: str
+    row_index: int      # 1-based; 0 = di luar baris (mis. indexing tabel)
+    start: float        # detik sejak Profiler dibuat (time.perf_counter)
+    dur: float
+    lane: str           # nama task asyncio (worker) → satu jalur di trace
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile; values harus sudah terurut."""
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)] if values else 0.0
+
+
+class Profiler:
+    """
+    Span waktu monotonic per tahap (CLICK_EDIT, OPEN_TAB, FILL, SUBMIT, ...). Baris aktif disimpan
+    di ContextVar sehingga helper yang dipanggil worker cukup memanggil `PROFILER.span("TAHAP")`.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: list[Span] = []
+        self._row: ContextVar[int] = ContextVar("sbr_profile_row", default=0)
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            try:
+                lane = asyncio.current_task().get_name()
+            except (RuntimeError, AttributeError):
+                lane = "main"
+            self.spans.append(Span(stage, self._row.get(), start - self.t0, end - start, lane))
+
+    @contextmanager
+    def row(self, row_index: int):
+        """Span ROW untuk satu baris; span tahap di dalamnya ikut tercatat dengan row_index ini."""
+        token = self._row.set(row_index)
+        try:
+            with self.span("ROW"):
+                yield
+        finally:
+            self._row.reset(token)
+
+    def report(self, slowest: int = 5) -> str:
+        by_stage = defaultdict(list)
+        for s in self.spans:
+            by_stage[s.stage].append(s.dur)
+        if not by_stage:
+            return "[PROFIL] Tidak ada tahap yang terukur."
+        lines = ["[PROFIL] Durasi per tahap (detik):",
+                 f"  {'tahap':<18}{'n':>6}{'p50':>9}{'p95':>9}{'max':>9}{'total':>10}"]
+        for stage, durs in sorted(by_stage.items(), key=lambda kv: -sum(kv[1])):
+            durs.sort()
+            lines.append(f"  {stage:<18}{len(durs):>6}{percentile(durs, 50):>9.2f}{percentile(durs, 95):>9.2f}"
+                         f"{durs[-1]:>9.2f}{sum(durs):>10.1f}")
+        rows = sorted((s for s in self.spans if s.stage == "ROW"), key=lambda s: -s.dur)[:slowest]
+        if rows:
+            lines.append("  Baris paling lambat: " + ", ".join(f"#{s.row_index} {s.dur:.1f}s" for s in rows))
+        return "\n".join(lines)
+
+    def write_trace(self, path) -> None:
+        """Ekspor Chrome trace (buka di chrome://tracing atau ui.perfetto.dev)."""
+        lanes = {}
+        events = []
+        for s in self.spans:
+            tid = lanes.setdefault(s.lane, len(lanes) + 1)
+            events.append({"name": s.stage, "ph": "X", "pid": 1, "tid": tid,
+                           "ts": round(s.start * 1e6), "dur": round(s.dur * 1e6),
+                           "args": {"row_index": s.row_index}})
+        events += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}}
+                   for lane, tid in lanes.items()]
+        Path(path).write_text(json.dumps({"traceEvents": events}), encoding="utf-8")
+
+
+PROFILER = Profiler()   # satu profiler per proses (tiap skrip dijalankan terpisah)
+
+
+# ---------- Governor AIMD (paralelisme & jeda adaptif) ----------
+
+class Governor:
+    """
+    Pengatur beban gaya AIMD di sekitar loop baris. Sinyal sukses menaikkan batas paralel
+    sedikit demi sedikit (+1 per satu "jendela" baris sukses); sinyal kemacetan (timeout, submit tanpa
+    konfirmasi/sinyal sukses, latensi submit > latency_factor x baseline) memotong batas jadi setengah.
+    Bila batas sudah di min_limit, yang dinaikkan adalah jeda sebelum baris berikutnya (x2, maks max_delay_s).
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, enabled: bool = True,
+                 latency_factor: float = 3.0, cooldown_s: float = 5.0, max_delay_s: float = 10.0):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.enabled = enabled
+        self.latency_factor = latency_factor
+        self.cooldown_s = cooldown_s
+        self.max_delay_s = max_delay_s
+        self.limit = float(max_limit)
+        self.delay = 0.0
+        self.active = 0
+        self.stats: Counter = Counter()
+        self._baseline: list[float] = []
+        self._last_cut = -math.inf
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Tahan worker sampai jumlah baris aktif di bawah batas saat ini."""
+        if not self.enabled:
+            yield
+            return
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield
+        finally:
+            async with self._cond:
+                self.active -= 1
+                self._cond.notify_all()
+
+    def success(self, latency_s: float | None = None) -> None:
+        self.stats["ok"] += 1
+        if not self.enabled:
+            return
+        if latency_s is not None:
+            if len(self._baseline) < 5:
+                self._baseline.append(latency_s)
+            elif latency_s > self.latency_factor * sorted(self._baseline)[len(self._baseline) // 2]:
+                self.congestion("latency")
+                return
+        if self.delay:
+            self.delay = max(self.delay - 0.5, 0.0)
+            return
+        before = int(self.limit)
+        self.limit = min(self.limit + 1 / self.limit, float(self.max_limit))
+        if int(self.limit) != before:
+            print(f"[GOVERNOR] paralel naik ke {int(self.limit)}")
+
+    def congestion(self, reason: str) -> None:
+        self.stats[reason] += 1
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self._last_cut < self.cooldown_s:
+            return      # satu pemotongan per gelombang kegagalan
+        self._last_cut = now
+        if self.limit > self.min_limit:
+            self.limit = max(self.limit / 2, float(self.min_limit))
+        else:
+            self.delay = min(max(self.delay * 2, 1.0), self.max_delay_s)
+        print(f"[GOVERNOR] {reason}: paralel={int(self.limit)} jeda={self.delay:.1f} dtk")
+
+    def summary(self) -> str:
+        signals = " ".join(f"{k}={v}" for k, v in sorted(self.stats.items()))
+        return f"[GOVERNOR] akhir: paralel={int(self.limit)}/{self.max_limit} jeda={self.delay:.1f} dtk ({signals})"
+
+
+# ---------- Filter resource tab form (CDP Network.setBlockedURLs / context.route) ----------
+
+BLOCK_RESOURCE_TYPES = ("image", "font", "media")
+BLOCK_URL_PATTERNS = (
+    r"google-analytics\.com", r"googletagmanager\.com", r"doubleclick\.net", r"hotjar\.com", r"facebook\.net",
+    # tile peta widget lat/lon: tidak dibutuhkan untuk mengisi angka koordinat
+    r"tile\.openstreetmap\.org", r"arcgisonline\.com", r"api\.mapbox\.com", r"google\.com/vt/",
+)
+# selalu diteruskan walau tipe/domainnya masuk daftar blokir (skrip yang dipakai form)
+ALLOW_URL_PATTERNS = (r"jquery", r"bootstrap", r"sweetalert", r"select2", r"datatables")
+# setBlockedURLs hanya mengenal pola URL wildcard, jadi tipe resource dipetakan ke ekstensi file
+RESOURCE_TYPE_EXTENSIONS = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "svg", "ico", "bmp"),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+    "media": ("mp4", "webm", "mp3", "ogg", "wav"),
+    "stylesheet": ("css",),
+}
+
+
+def regex_to_glob(pattern: str) -> str | None:
+    """Pola regex sederhana (domain/path, titik di-escape) -> wildcard CDP; None bila tidak bisa diterjemahkan."""
+    s = pattern.replace(r"\.", ".").replace(".*", "*")
+    if re.search(r"[\\^$()\[\]{}+?|]", s):
+        return None
+    return f"*{s}*"
+
+
+@dataclass
+class ResourceFilter:
+    """
+    Blokir resource yang tidak dibutuhkan saat mengisi form.
+    Chrome yang di-attach (`spare` = tab Direktori): tiap tab form diberi sesi CDP sendiri dengan
+    Network.setBlockedURLs, sehingga hanya tab form yang terkena dan cache HTTP Chrome tetap terpakai.
+    Headless (`spare` None): handler context.route; urutan aturan allowlist -> tipe resource -> pola URL.
+    """
+    block_types: frozenset[str]
+    block_url: re.Pattern | None
+    allow_url: re.Pattern | None
+    spare: Page | None = None
+    url_globs: tuple[str, ...] = ()
+    blocked: Counter = field(default_factory=Counter)
+    pending: dict = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, types, block_patterns=(), allow_patterns=(), spare: Page | None = None) -> "ResourceFilter":
+        def combine(patterns):
+            patterns = [p for p in patterns if p]
+            return re.compile("|".join(f"(?:{p})" for p in patterns), re.I) if patterns else None
+        types = frozenset(t for t in types if t)
+        globs = [f"*.{ext}{tail}" for t in sorted(types) for ext in RESOURCE_TYPE_EXTENSIONS.get(t, ())
+                 for tail in ("", "?*")]
+        for p in block_patterns if spare is not None else ():
+            if p:
+                glob = regex_to_glob(p)
+                if glob is None:
+                    print(f"[WARN] Pola --block-url '{p}' tidak bisa dipakai di Chrome yang di-attach (hanya --headless)")
+                else:
+                    globs.append(glob)
+        return cls(types, combine(block_patterns), combine(allow_patterns), spare, tuple(globs))
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if self.allow_url and self.allow_url.search(url):
+            return False
+        return resource_type in self.block_types or bool(self.block_url and self.block_url.search(url))
+
+    async def handle(self, route: Route) -> None:
+        req = route.request
+        if self.should_block(req.url, req.resource_type):
+            self.blocked[req.resource_type] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_page(self, page: Page) -> None:
+        if page is not self.spare:
+            self.pending[page] = asyncio.ensure_future(self._attach(page))
+            page.once("close", lambda pg: self.pending.pop(pg, None))
+
+    async def _attach(self, page: Page) -> None:
+        try:
+            session = await page.context.new_cdp_session(page)
+            session.on("Network.loadingFailed", self._on_failed)
+            await session.send("Network.enable")
+            await session.send("Network.setBlockedURLs", {"urls": list(self.url_globs)})
+        except Exception as e:
+            if not page.is_closed():   # tab tertutup sebelum sesi siap: tidak ada yang perlu diblokir
+                print(f"[WARN] Filter resource tidak terpasang di tab form: {e}")
+
+    def _on_failed(self, event: dict) -> None:
+        if event.get("blockedReason") == "inspector":
+            self.blocked[(event.get("type") or "other").lower()] += 1
+
+    async def ready(self, page: Page) -> None:
+        """Tunggu filter terpasang di tab baru sebelum navigasi (tab popup Edit hanya best-effort)."""
+        task = self.pending.get(page)
+        if task is not None:
+            await task
+
+    async def install(self, context: BrowserContext) -> None:
+        if self.spare is None:
+            await context.route("**/*", self.handle)
+        else:
+            context.on("page", self._on_page)
+
+    def summary(self) -> str:
+        total = sum(self.blocked.values())
+        detail = " ".join(f"{k}={v}" for k, v in self.blocked.most_common())
+        return f"[INFO] Request diblokir: {total}" + (f" ({detail})" if detail else "")
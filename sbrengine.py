@@ -0,0 +1,973 @@
+"""
+Mesin bersama sbrfill.py dan sbrcancel.py: pipeline per baris
+load (Excel) → match (tabel direktori) → open (tab form) → act → verify → log.
+Aksi seperti isi form atau Cancel Submit dipasang sebagai turunan RowAction; pool worker,
+governor, profiler, filter resource, shard endpoint CDP/headless dan coba ulang cukup dibuat sekali di sini.
+"""
+import asyncio
+import argparse
+import csv
+import json
+import re
+import time
+from pathlib import Path
+from dataclasses import dataclass, field
+from urllib.parse import quote
+import pandas as pd
+from playwright.async_api import async_playwright, Error as PWError, Page, BrowserContext, TimeoutError as PWTimeout
+from sbrcore import (ALLOW_URL_PATTERNS, BLOCK_RESOURCE_TYPES, BLOCK_URL_PATTERNS, LOCK_TEXT_RE, LOCK_WEAK_RE,
+                     PROFILER, TABLE_SELECTOR, DirectoryCursor, DirectoryIndex, DirectoryRow, ExcelRow, Governor,
+                     Journal, LogSink, ResourceFilter, load_sheet_cached, log_event, match_pending,
+                     normspace, ts)
+
+# ====== KONFIGURASI DEFAULT ======
+
+# Chrome dibuka dengan --remote-debugging-port=9222
+CDP_ENDPOINT = "http://localhost:9222"
+SHEET_NAME = 0
+PAUSE_AFTER_EDIT_CLICK_MS = 1000
+MAX_WAIT_MS = 5000
+STATE_PATH = "sbr_state.json"    # storage_state (cookie/sesi) hasil --export-state; RAHASIA, jangan dibagikan
+LOCK_RETRY_BASE_S = 30       # jeda awal sebelum baris EDIT_LOCKED dicoba ulang (x2 per putaran)
+LOCK_RETRY_MAX_DELAY_S = 300
+LOCK_RETRY_TOTAL_S = 900     # default --lock-retry-max
+RETRY_BASE_S = 5             # jeda coba ulang hasil sementara (--retries): 5, 10, 20, ... detik
+SLOW_MODE = False          # jeda observasi antar langkah; aktifkan dengan --slow-mode
+STEP_DELAY_MS = 700
+VERBOSE = True
+
+# Hasil pipeline per baris; kode lain dari act() dipetakan ke ERROR oleh RowAction.verify
+RESULTS = ("OK", "SKIPPED", "MISSING", "LOCKED", "ERROR", "FATAL")
+# + HTTP_5xx / HTTP_429 → governor
+CONGESTION_CODES = ("NO_SUCCESS_SIGNAL", "NO_CONFIRM", "NO_RESPONSE", "NO_CANCEL_RESPONSE")
+
+
+# ---------- Load: file Excel ----------
+
+@dataclass
+class ExcelSelection:
+    path: Path
+    sheet_index: int = 0
+
+
+def _format_candidates(paths):
+    return ", ".join(str(p) for p in paths)
+
+
+def resolve_excel(path_arg: str | None, search_dir: Path, sheet_index: int) -> ExcelSelection:
+    """
+    Jika --excel diberikan -> pakai itu.
+    Jika tidak -> cari *.xlsx di search_dir dan search_dir/data (harus 1 file).
+    """
+    if path_arg:
+        p = Path(path_arg).expanduser().resolve()
+        if not p.is_file():
+            raise FileNotFoundError(f"File Excel tidak ditemukan: {p}")
+        return ExcelSelection(path=p, sheet_index=sheet_index)
+
+    locations = [search_dir]
+    seen, candidates = set(), []
+    for loc in locations:
+        if not loc.exists():
+            continue
+        for c in sorted(loc.glob("*.xlsx")):
+            r = c.resolve()
+            if r not in seen:
+                seen.add(r)
+                candidates.append(r)
+
+    if not candidates:
+        raise FileNotFoundError(
+            "Gunakan argumen --excel untuk memilih file secara eksplisit."
+        )
+    if len(candidates) > 1:
+        raise RuntimeError(
+            "Ditemukan lebih dari satu file Excel. Pilih salah satu dengan --excel. Kandidat: "
+            f"{_format_candidates(candidates)}"
+        )
+    return ExcelSelection(path=candidates[0], sheet_index=sheet_index)
+
+
+def load_dataframe(selection: ExcelSelection, use_cache: bool = True) -> pd.DataFrame:
+    return load_sheet_cached(selection.path, selection.sheet_index, use_cache=use_cache)
+
+
+def ensure_required_columns(df: pd.DataFrame, required=()) -> None:
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise RuntimeError(f"Kolom wajib belum ada di Excel: {', '.join(missing)}")
+
+
+def slice_rows(df: pd.DataFrame, start: int | None, end: int | None) -> tuple[int, int]:
+    start_idx = 0 if start is None else max(start - 1, 0)
+    end_idx = len(df) if end is None else min(end, len(df))
+    return start_idx, end_idx
+
+
+# ---------- Utilitas halaman ----------
+
+def vlog(msg: str) -> None:
+    if VERBOSE:
+        print(msg)
+
+
+async def slow_pause(page: Page, ms: int | None = None):
+    """Berhenti sejenak untuk memberi waktu observasi di layar."""
+    if SLOW_MODE:
+        await page.wait_for_timeout(ms or STEP_DELAY_MS)
+
+
+async def safe_screenshot(page: Page, label: str, folder: Path = Path("screenshots")) -> str:
+    try:
+        folder.mkdir(exist_ok=True)
+        safe_label = re.sub(r"[^a-zA-Z0-9_-]+", "-", label)[:50]
+        fname = folder / f"{ts()}_{safe_label}.png"
+        await page.screenshot(path=str(fname), full_page=True)
+        return str(fname)
+    except Exception:
+        return ""
+
+
+async def get_active_directory_page(ctx: BrowserContext) -> Page:
+    pages = ctx.pages
+    if not pages:
+        raise RuntimeError("Tidak ada tab terbuka. Pastikan Chrome sudah membuka halaman Direktori Usaha.")
+    return pages[-1]
+
+
+# ---------- Open: tab form ----------
+
+FORM_READY_SELECTOR = "#catatan_profiling, input[id^='kondisi_']"
+
+LOCK_STATE_JS = """
+([formSel, lockRe, weakRe]) => {
+    if (document.querySelector(formSel)) return 'form';
+    if (/not-?authorized/i.test(location.href)) return 'locked';
+    const text = (document.title || '') + '\\n' + (document.body ? document.body.innerText : '');
+    if (new RegExp(lockRe, 'i').test(text)) return 'locked';
+    if (document.readyState === 'complete' && new RegExp(weakRe, 'i').test(text)) return 'locked';
+    return false;
+}
+"""
+
+
+async def is_edit_locked_page(p: Page, timeout_ms: int = MAX_WAIT_MS) -> bool:
+    """
+    Balapan form siap vs halaman kunci dalam satu wait_for_function (polling per mutasi DOM):
+    begitu elemen form muncul jawabannya langsung False, tanpa menunggu domcontentloaded.
+    Tidak ada sinyal sampai timeout → dianggap tidak terkunci (pengisian form yang akan melaporkan error).
+    """
+    try:
+        handle = await p.wait_for_function(LOCK_STATE_JS, arg=[FORM_READY_SELECTOR, LOCK_TEXT_RE, LOCK_WEAK_RE],
+                                           polling="mutation", timeout=timeout_ms)
+        return await handle.json_value() == "locked"
+    except PWError:
+        return False
+
+
+async def try_click(locator, visible_ms=800):
+    try:
+        if await locator.is_visible(timeout=visible_ms):
+            await locator.click()
+            return True
+    except Exception:
+        pass
+    return False
+
+
+async def first_signal(*waits) -> int | None:
+    """
+    Jalankan beberapa wait Playwright bersamaan dan kembalikan indeks wait pertama
+    yang berhasil (None bila semuanya gagal/timeout). Pengganti polling berjeda tetap.
+    """
+    tasks = [asyncio.ensure_future(w) for w in waits]
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    return tasks.index(t)
+        return None
+    finally:
+        for t in pending:
+            t.cancel()
+
+
+class EditNotFound(RuntimeError):
+    """Tombol Edit untuk baris tertentu tidak ditemukan / gagal diklik di tabel direktori."""
+
+
+def row_match_key(match_by: str, row: ExcelRow) -> str:
+    if match_by == "idsbr":
+        return row.idsbr
+    if match_by == "name":
+        return row.nama
+    return ""
+
+
+def pending_key(match_by: str, row: ExcelRow, start_idx: int) -> str:
+    """Kunci baris untuk pencocokan lintas halaman: posisi relatif (index) atau teks lowercase."""
+    if match_by == "index":
+        return str(row.index - start_idx)
+    return row_match_key(match_by, row).lower()
+
+
+async def open_form_tab(directory: DirectoryIndex, drow: DirectoryRow, key: str) -> Page:
+    """
+    Klik Edit (+ popup 'Ya, edit!') lalu kembalikan tab form yang dibuka oleh klik itu.
+    expect_popup mengikat tab baru ke klik ini, jadi tab tidak tertukar antar worker.
+    """
+    page = directory.page
+    async with page.expect_popup(timeout=MAX_WAIT_MS * 2) as popup_info:
+        with PROFILER.span("CLICK_EDIT"):
+            try:
+                clicked = await directory.click_edit(drow, key)
+                if not clicked and key:
+                    # tabel berubah sejak snapshot → ambil snapshot baru sekali
+                    await directory.refresh()
+                    drow = directory.find(key)
+                    clicked = drow is not None and await directory.click_edit(drow, key)
+            except Exception as e:
+                raise EditNotFound(f"CLICK_EDIT_EXCEPTION: {e}") from e
+            if not clicked:
+                raise EditNotFound("CLICK_EDIT")
+
+        with PROFILER.span("OPEN_TAB"):
+            # popup 'Ya, edit!' hanya diklik bila muncul sebelum tab form terbuka
+            ya_edit = page.get_by_role("button", name=re.compile(r"Ya,\s*edit!?$", re.I))
+            if await first_signal(ya_edit.wait_for(state="visible", timeout=MAX_WAIT_MS),
+                                  asyncio.shield(popup_info.value)) == 0:
+                try:
+                    await ya_edit.click()
+                except PWError:
+                    pass
+            await popup_info.value
+
+        await slow_pause(page, PAUSE_AFTER_EDIT_CLICK_MS)
+
+    return await popup_info.value
+
+
+async def read_edit_url_template(page: Page) -> str:
+    """
+    Baca pola URL form edit dari tombol Edit pertama di tabel direktori.
+    IDSBR baris tersebut (sel yang teksnya muncul di URL) diganti placeholder {idsbr}.
+    """
+    table = page.locator("#table_direktori_usaha")
+    await table.wait_for(state="visible", timeout=MAX_WAIT_MS)
+    info = await page.evaluate("""
+        () => {
+            const btn = document.querySelector('#table_direktori_usaha tbody tr a.btn-edit-perusahaan');
+            if (!btn) return null;
+            const raw = btn.getAttribute('data-href') || btn.getAttribute('data-url') || btn.getAttribute('href') || '';
+            let href = '';
+            try { href = new URL(raw, document.baseURI).href; } catch (e) {}
+            const cells = [...btn.closest('tr').cells].map(td => (td.innerText || '').trim());
+            return { href, cells };
+        }
+    """)
+    if not info or not re.match(r"https?://", info.get("href") or ""):
+        raise RuntimeError("Tidak bisa membaca URL form dari tombol Edit. Gunakan --edit-url-template.")
+
+    href = info["href"]
+    ids = [c for c in (normspace(c) for c in info.get("cells") or []) if re.fullmatch(r"\d{6,}", c) and c in href]
+    if not ids:
+        raise RuntimeError(f"IDSBR tidak ditemukan di URL form ({href}). Gunakan --edit-url-template.")
+
+    idsbr = max(ids, key=len)
+    pos = href.rindex(idsbr)
+    return href[:pos] + "{idsbr}" + href[pos + len(idsbr):]
+
+
+def build_edit_url(template: str, idsbr: str) -> str:
+    return template.replace("{idsbr}", quote(idsbr, safe=""))
+
+
+async def open_form_by_url(context: BrowserContext, url: str, resources: ResourceFilter | None = None) -> Page:
+    """Buka form langsung lewat URL di tab baru, tanpa melewati tabel direktori."""
+    new_page = await context.new_page()
+    try:
+        if resources:
+            await resources.ready(new_page)
+        await new_page.goto(url, wait_until="domcontentloaded", timeout=MAX_WAIT_MS * 2)
+    except PWError:
+        try:
+            await new_page.close()
+        except PWError:
+            pass
+        raise
+    return new_page
+
+
+async def _accept_beforeunload(dialog):
+    # tab dipakai ulang: "tinggalkan halaman?" diterima agar navigasi ke baris berikutnya tidak tertahan
+    if dialog.type == "beforeunload":
+        await dialog.accept()
+    else:
+        await dialog.dismiss()
+
+
+class TabPool:
+    """
+    Tab form yang dipakai ulang antar baris (--reuse-tab N). Worker mengambil tab idle, menavigasikannya
+    ke URL form baris berikutnya, lalu mengembalikannya; jumlah tab = jumlah worker. Setelah N baris
+    tab ditutup dan diganti baru agar memori renderer tidak terus naik pada run panjang.
+    """
+
+    def __init__(self, context: BrowserContext, max_uses: int, resources: ResourceFilter | None = None):
+        self.context = context
+        self.resources = resources
+        self.max_uses = max_uses
+        self.idle: list[Page] = []
+        self.uses: dict[Page, int] = {}
+        self.created = 0
+        self.recycled = 0
+
+    async def acquire(self) -> Page:
+        while self.idle:
+            page = self.idle.pop()
+            if not page.is_closed():
+                return page
+            self.uses.pop(page, None)
+        page = await self.context.new_page()
+        if self.resources:
+            await self.resources.ready(page)
+        page.on("dialog", _accept_beforeunload)
+        self.uses[page] = 0
+        self.created += 1
+        return page
+
+    def owns(self, page: Page) -> bool:
+        return page in self.uses
+
+    async def release(self, page: Page) -> None:
+        """Kembalikan tab setelah satu baris; tab yang sudah N kali dipakai ditutup."""
+        n = self.uses.pop(page, 0) + 1
+        if page.is_closed():
+            return
+        if n >= self.max_uses:
+            self.recycled += 1
+            try:
+                await page.close()
+            except PWError:
+                pass
+            return
+        self.uses[page] = n
+        self.idle.append(page)
+
+    def forget(self, page: Page) -> None:
+        """Tab dibiarkan terbuka untuk diperiksa; tidak dipakai ulang."""
+        self.uses.pop(page, None)
+
+    async def close(self) -> None:
+        for page in list(self.uses):
+            try:
+                await page.close()
+            except PWError:
+                pass
+        self.uses.clear()
+        self.idle.clear()
+
+    def summary(self) -> str:
+        return f"[TAB] {self.created} tab form dibuat, {self.recycled} didaur ulang (tiap {self.max_uses} baris)"
+
+
+async def open_form_in_pool(tabs: TabPool, url: str) -> Page:
+    """Navigasikan tab dari pool ke URL form; tab yang gagal dinavigasi dibuang dari pool."""
+    page = await tabs.acquire()
+    try:
+        await page.goto(url, wait_until="domcontentloaded", timeout=MAX_WAIT_MS * 2)
+    except PWError:
+        tabs.forget(page)
+        try:
+            await page.close()
+        except PWError:
+            pass
+        raise
+    return page
+
+
+# ---------- Sumber browser: attach CDP atau Chromium headless ----------
+
+def state_meta_path(state_path) -> Path:
+    """File pendamping storage_state: URL halaman Direktori Usaha saat di-export."""
+    return Path(state_path).with_suffix(".meta.json")
+
+
+async def export_state(args) -> None:
+    """Simpan cookie/sesi Chrome yang sedang login (attach CDP) untuk dipakai mode --headless."""
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(args.cdp[0])
+        context = browser.contexts[0]
+        page = await get_active_directory_page(context)
+        await context.storage_state(path=args.export_state)
+        state_meta_path(args.export_state).write_text(json.dumps({"directory_url": page.url}), encoding="utf-8")
+    print(f"[INFO] Sesi tersimpan di {args.export_state} (halaman direktori: {page.url})")
+
+
+def build_resource_filter(args, spare: Page | None = None) -> ResourceFilter | None:
+    if not args.block:
+        return None
+    return ResourceFilter.build(args.block_types.split(","), BLOCK_URL_PATTERNS + tuple(args.block_url),
+                                ALLOW_URL_PATTERNS + tuple(args.allow_url), spare=spare)
+
+
+async def open_directory_page(p, source: str, args) -> tuple[BrowserContext, Page, ResourceFilter | None]:
+    """
+    Tab Direktori Usaha dari satu sumber: endpoint CDP (Chrome yang dibuka manual) atau,
+    dengan --headless, file storage_state yang dimuat ke Chromium headless milik Playwright.
+    Filter resource dipasang di context: pada Chrome yang di-attach hanya tab form baru yang diberi
+    sesi CDP pemblokir (tab Direktori utuh, cache HTTP tetap), pada headless lewat context.route.
+    """
+    if not args.headless:
+        browser = await p.chromium.connect_over_cdp(source)
+        context = browser.contexts[0]
+        page = await get_active_directory_page(context)
+        rfilter = build_resource_filter(args, spare=page)
+        if rfilter:
+            await rfilter.install(context)
+        return context, page, rfilter
+
+    url = args.directory_url
+    meta = state_meta_path(source)
+    if not url and meta.exists():
+        url = json.loads(meta.read_text(encoding="utf-8")).get("directory_url")
+    if not url:
+        raise RuntimeError(f"URL Direktori Usaha tidak diketahui: isi --directory-url atau export ulang {source}")
+
+    browser = await p.chromium.launch(headless=True)
+    context = await browser.new_context(storage_state=source)
+    rfilter = build_resource_filter(args)
+    if rfilter:
+        await rfilter.install(context)
+    page = await context.new_page()
+    await page.goto(url, wait_until="domcontentloaded", timeout=MAX_WAIT_MS * 4)
+    try:
+        await page.locator(TABLE_SELECTOR).wait_for(state="attached", timeout=MAX_WAIT_MS * 2)
+    except PWError:
+        raise RuntimeError(f"Tabel direktori tidak muncul di {page.url}; sesi {source} mungkin kedaluwarsa, "
+                           f"jalankan --export-state lagi") from None
+    return context, page, rfilter
+
+
+# ---------- Aksi per baris (plug-in) ----------
+
+class RowAction:
+    """
+    Aksi yang dijalankan pipeline di tab form tiap baris. Turunan mengisi atribut kelas dan
+    meng-override act(); tahap lain (load, match, open, verify, log) dikerjakan mesin.
+    """
+    name = "aksi"                         # dipakai di judul span profiler & log
+    log_csv = "log_sbr.csv"
+    screenshot_dir = Path("screenshots")
+    required_columns: tuple[str, ...] = ()
+    check_lock = True                     # form dikunci user lain → LOCKED (dicoba ulang oleh retry_locked)
+    retry_codes = ("NO_TAB", "NO_RESPONSE", "HTTP_429")   # kode sementara untuk --retries (+ HTTP_5xx)
+    fatal_codes = ("SESSION", "NO_EDIT")  # kode yang menghentikan seluruh run (FATAL)
+
+    def heading(self, row: ExcelRow) -> str:
+        return f"=== Baris {row.index + 1} :: {row.nama} ==="
+
+    async def act(self, state: "RunState", row: ExcelRow, form: Page) -> tuple[str, str]:
+        """
+        Kerjakan aksi di tab form yang sudah terbuka. Hasil: (kode, detail), mis. ("OK", "").
+        Bila sukses, laporkan latensi round-trip server saja (mis. Submit) lewat state.governor.success();
+        waktu isi form atau jeda --slow-mode tidak boleh ikut agar governor tidak salah memotong paralelisme.
+        """
+        raise NotImplementedError
+
+    def verify(self, code: str) -> str:
+        """Petakan kode act() ke hasil pipeline (RESULTS)."""
+        if code in RESULTS:
+            return code
+        if code in self.fatal_codes:
+            return "FATAL"
+        return "ERROR"
+
+    def keep_open(self, code: str) -> bool:
+        """Tab form dibiarkan terbuka untuk diperiksa (mis. galat isian)."""
+        return False
+
+    def max_concurrency(self, args) -> int:
+        """Batas atas paralelisme governor."""
+        return args.workers
+
+    def retryable(self, code: str) -> bool:
+        return code in self.retry_codes or code.startswith("HTTP_5")
+
+    async def run_rows(self, state: "RunState", rows: list[ExcelRow], start_idx: int) -> dict[int, str]:
+        """Satu putaran atas `rows`; override untuk jalur lain (mis. --engine http di sbrfill)."""
+        return await process_rows(state, rows, start_idx)
+
+
+@dataclass
+class RunState:
+    action: RowAction
+    context: BrowserContext
+    page: Page                              # tab Direktori Usaha
+    args: argparse.Namespace
+    log: LogSink
+    dir_lock: asyncio.Lock
+    directory: DirectoryIndex
+    governor: Governor
+    journal: Journal | None = None
+    stop: asyncio.Event = field(default_factory=asyncio.Event)
+    edit_url_template: str | None = None    # terisi bila --open-by url
+    endpoint: str = CDP_ENDPOINT
+    resources: ResourceFilter | None = None
+    tabs: TabPool | None = None             # terisi bila --reuse-tab
+    outcomes: dict = field(default_factory=dict)    # index baris → (kode, detail, percobaan)
+
+
+# ---------- Pipeline satu baris ----------
+
+async def open_row(state: RunState, row: ExcelRow, pos: int, drow: DirectoryRow | None) -> tuple[Page | None, str, str]:
+    """Tahap match + open. Hasil: (tab form, "", "") atau (None, kode, detail) bila gagal."""
+    page, args, i = state.page, state.args, row.index
+
+    def log(level: str, stage: str, note: str, screenshot: str = ""):
+        log_event(state.log, i+1, level, stage, note, screenshot, idsbr=row.idsbr)
+
+    if state.edit_url_template:
+        # --- Buka form langsung lewat URL ---
+        if not row.idsbr:
+            log("ERROR", "OPEN_TAB", "IDSBR kosong, URL form tidak bisa dibentuk")
+            return None, "ERROR", "IDSBR kosong"
+        try:
+            with PROFILER.span("OPEN_TAB"):
+                url = build_edit_url(state.edit_url_template, row.idsbr)
+                if state.tabs:
+                    return await open_form_in_pool(state.tabs, url), "", ""
+                return await open_form_by_url(state.context, url, state.resources), "", ""
+        except PWError as e:
+            if isinstance(e, PWTimeout):
+                state.governor.congestion("timeout")
+            log("ERROR", "OPEN_TAB", f"Gagal membuka URL form: {e}")
+            return None, "NO_TAB", normspace(e)[:200]
+
+    # --- Klik Edit & ambil tab baru (tabel direktori hanya boleh dipakai satu worker) ---
+    with PROFILER.span("DIR_LOCK_WAIT"):
+        await state.dir_lock.acquire()
+    try:
+        key = row_match_key(args.match_by, row)
+        if drow is None:
+            drow = state.directory.find(key) if key else (
+                state.directory.at(pos) if args.match_by == "index" else None)
+        if drow is None:
+            log("WARN", "NOT_FOUND",
+                f"Baris {key or pos + 1} tidak ada di tabel direktori yang tampil")
+            return None, "MISSING", ""
+        try:
+            return await open_form_tab(state.directory, drow, key), "", ""
+        except EditNotFound as e:
+            shot = await safe_screenshot(page, f"gagal_klik_edit_baris_{i+1}", state.action.screenshot_dir)
+            log("ERROR", "CLICK_EDIT", str(e), shot)
+            return None, "NO_EDIT", str(e)
+        except PWError as e:
+            if isinstance(e, PWTimeout):
+                state.governor.congestion("timeout")
+            shot = await safe_screenshot(page, f"no_new_tab_baris_{i+1}", state.action.screenshot_dir)
+            log("ERROR", "OPEN_TAB", f"Tidak ada tab form: {e}", shot)
+            return None, "NO_TAB", normspace(e)[:200]
+    finally:
+        state.dir_lock.release()
+
+
+async def process_row(state: RunState, row: ExcelRow, pos: int, drow: DirectoryRow | None = None) -> tuple[str, str]:
+    """
+    Satu percobaan untuk satu baris Excel: buka form, (cek kunci), act, tutup.
+    `drow` diisi bila baris tabel sudah ditemukan lebih dulu (mode --all-pages).
+    Hasil: (kode, detail) — kode mentah dari act() atau tahap open (MISSING/NO_TAB/NO_EDIT/LOCKED).
+    """
+    action, page = state.action, state.page
+    i = row.index
+    single = state.args.workers == 1
+
+    def log(level: str, stage: str, note: str, screenshot: str = ""):
+        log_event(state.log, i+1, level, stage, note, screenshot, idsbr=row.idsbr)
+
+    print(f"\n{action.heading(row)}")
+
+    new_page, code, detail = await open_row(state, row, pos, drow)
+    if new_page is None:
+        return code, detail
+
+    if single:
+        await new_page.bring_to_front()
+
+    async def close_form():
+        with PROFILER.span("CLOSE"):
+            if state.tabs and state.tabs.owns(new_page):
+                await state.tabs.release(new_page)
+            else:
+                try:
+                    await new_page.close()
+                except PWError:
+                    pass
+            if single:
+                await page.bring_to_front()
+
+    # Jika ternyata form sedang diedit profiler lain
+    if action.check_lock:
+        try:
+            with PROFILER.span("LOCK_CHECK"):
+                locked = await is_edit_locked_page(new_page)
+            if locked:
+                shot = await safe_screenshot(new_page, f"edit_locked_baris_{i+1}", action.screenshot_dir)
+                log("WARN", "EDIT_LOCKED",
+                    "Form sedang dikunci/diedit oleh user lain. Melewati baris ini.", shot)
+                await close_form()
+                return "LOCKED", ""
+        except Exception:
+            pass
+
+    # --- Act ---
+    try:
+        code, detail = await action.act(state, row, new_page)
+    except Exception as e:
+        if isinstance(e, PWTimeout):
+            state.governor.congestion("timeout")
+        shot = await safe_screenshot(new_page, f"exception_{action.name}_baris_{i+1}", action.screenshot_dir)
+        log("ERROR", action.name.upper(), f"EXCEPTION:{e}", shot)
+        await close_form()
+        return "ERROR", normspace(e)[:200]
+
+    # --- Verify: umpan balik governor (latensi sukses dilaporkan act() sendiri) ---
+    if code in CONGESTION_CODES or code.startswith("HTTP_5") or code == "HTTP_429":
+        state.governor.congestion(code.lower())
+
+    if action.keep_open(code):
+        if state.tabs:
+            state.tabs.forget(new_page)
+        if single:
+            await page.bring_to_front()
+    else:
+        await close_form()
+        if single and code == "OK":
+            await slow_pause(page, 800)
+    return code, detail
+
+
+async def run_attempts(state: RunState, row: ExcelRow, attempt_once) -> str | None:
+    """
+    Jalankan attempt_once() (coroutine → (kode, detail)) dengan coba ulang kode sementara
+    (maks --retries, jeda eksponensial RETRY_BASE_S), lalu tahap log: hasil per baris disimpan di
+    state.outcomes, ROW_DONE + jurnal bila OK, run dihentikan bila FATAL / ERROR + --stop-on-error.
+    Hasil: hasil pipeline, "FALLBACK" (baris diserahkan ke jalur lain) atau None bila run sudah
+    dihentikan sebelum baris dimulai.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        async with state.governor.slot():
+            if state.stop.is_set():
+                return None
+            with PROFILER.row(row.index + 1):
+                code, detail = await attempt_once()
+        if code == "FALLBACK":
+            return code
+        if (code == "OK" or attempt > state.args.retries or not state.action.retryable(code)
+                or state.stop.is_set()):
+            break
+        delay = RETRY_BASE_S * 2 ** (attempt - 1)
+        log_event(state.log, row.index+1, "WARN", "RETRY",
+                  f"{code}; percobaan ke-{attempt + 1} dalam {delay} detik", idsbr=row.idsbr)
+        await asyncio.sleep(delay)
+
+    state.outcomes[row.index] = (code, detail, attempt)
+    result = state.action.verify(code)
+    if result == "OK":
+        log_event(state.log, row.index+1, "OK", "ROW_DONE", "Baris selesai diproses", idsbr=row.idsbr)
+        if state.journal:
+            state.journal.record(row.idsbr, row.hash, row.index+1)
+    elif code == "SESSION":
+        print("[ERROR] Sesi login MatchaPro berakhir; proses dihentikan. Login ulang lalu jalankan lagi.")
+    if result == "FATAL" or (result == "ERROR" and state.args.stop_on_error):
+        state.stop.set()
+    return result
+
+
+async def run_row(state: RunState, row: ExcelRow, pos: int, drow: DirectoryRow | None = None) -> str | None:
+    """process_row lewat run_attempts (coba ulang + log hasil)."""
+    return await run_attempts(state, row, lambda: process_row(state, row, pos, drow))
+
+
+async def run_pool(state: RunState, items: list) -> dict[int, str]:
+    """Proses (row, pos, drow) dengan --workers worker; tiap worker memegang tab form-nya sendiri."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    results = {}
+
+    async def worker():
+        while not state.stop.is_set():
+            try:
+                row, pos, drow = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await run_row(state, row, pos, drow)
+            if result is not None:
+                results[row.index] = result
+
+    await asyncio.gather(*(worker() for _ in range(state.args.workers)))
+    return results
+
+
+async def process_rows(state: RunState, rows: list[ExcelRow], start_idx: int) -> dict[int, str]:
+    """Satu putaran atas `rows` (seluruh halaman tabel bila --all-pages). Hasil per index baris."""
+    args = state.args
+    if not args.all_pages:
+        return await run_pool(state, [(r, r.index - start_idx, None) for r in rows])
+
+    # Telusuri semua halaman tabel; baris Excel diproses di halaman tempat ia tampil
+    results = {}
+    pending = {}
+    for r in rows:
+        pending.setdefault(pending_key(args.match_by, r, start_idx), []).append(r)
+    cursor = DirectoryCursor(state.directory)
+    async for offset in cursor.pages():
+        batch = []
+        for n, drow in enumerate(state.directory.rows):
+            key = str(offset + n) if args.match_by == "index" else match_pending(drow, pending)
+            if key in pending:
+                batch += [(r, r.index - start_idx, drow) for r in pending.pop(key)]
+        print(f"[INFO] Halaman tabel mulai baris {offset + 1}: {len(batch)} baris cocok")
+        results.update(await run_pool(state, batch))
+        if state.stop.is_set() or not pending:
+            break
+    missing = sorted(((r.index, key, r) for key, rows in pending.items() for r in rows), key=lambda m: m[0])
+    for i, key, r in ([] if state.stop.is_set() else missing):
+        log_event(state.log, i+1, "WARN", "NOT_FOUND", f"Baris '{key}' tidak ada di semua halaman tabel direktori",
+                  idsbr=r.idsbr)
+        results[i] = "MISSING"
+        state.outcomes[i] = ("MISSING", "", 0)
+    return results
+
+
+async def retry_locked(state: RunState, rows: list[ExcelRow], results: dict[int, str], start_idx: int) -> None:
+    """
+    Baris EDIT_LOCKED dicoba ulang setelah putaran utama dengan jeda eksponensial
+    (LOCK_RETRY_BASE_S, x2 per putaran, maks LOCK_RETRY_MAX_DELAY_S) sampai total --lock-retry-max detik.
+    Hasil akhir tiap baris yang pernah terkunci dicatat di log: stage LOCK_GAVE_UP bila tetap terkunci
+    (dibaca --plan sebagai locked), LOCK_RETRY untuk hasil lain.
+    """
+    locked = [r for r in rows if results.get(r.index) == "LOCKED"]
+    if not locked:
+        return
+    attempts = {r.index: 0 for r in locked}
+    deadline = time.monotonic() + state.args.lock_retry_max
+    delay = LOCK_RETRY_BASE_S
+    while locked and not state.stop.is_set() and time.monotonic() + delay <= deadline:
+        print(f"\n[INFO] {len(locked)} baris masih terkunci; dicoba lagi dalam {delay:.0f} dtk")
+        await asyncio.sleep(delay)
+        for r in locked:
+            attempts[r.index] += 1
+        if not state.edit_url_template and not state.args.all_pages:
+            await state.directory.refresh()   # tabel bisa berubah selama jeda
+        results.update(await process_rows(state, locked, start_idx))
+        locked = [r for r in locked if results.get(r.index) == "LOCKED"]
+        delay = min(delay * 2, LOCK_RETRY_MAX_DELAY_S)
+
+    for r in rows:
+        if r.index not in attempts:
+            continue
+        n, result = attempts[r.index], results.get(r.index, "LOCKED")
+        if result in ("OK", "SKIPPED"):
+            log_event(state.log, r.index+1, "OK", "LOCK_RETRY", f"{result} setelah {n} kali coba ulang", idsbr=r.idsbr)
+        elif result == "LOCKED":
+            log_event(state.log, r.index+1, "WARN", "LOCK_GAVE_UP", f"Masih terkunci setelah {n} kali coba ulang",
+                      idsbr=r.idsbr)
+        else:
+            log_event(state.log, r.index+1, "WARN", "LOCK_RETRY", f"Masih {result} setelah {n} kali coba ulang",
+                      idsbr=r.idsbr)
+
+
+# ---------- Shard per endpoint & run lengkap ----------
+
+async def open_run_state(p, endpoint: str, action: RowAction, args, sink: LogSink, journal: Journal | None,
+                         stop: asyncio.Event) -> RunState:
+    """Buka satu sumber browser (CDP / headless) dan siapkan tabel direktori / pola URL form-nya."""
+    context, page, rfilter = await open_directory_page(p, endpoint, args)
+    state = RunState(action=action, context=context, page=page, args=args, log=sink, dir_lock=asyncio.Lock(),
+                     directory=DirectoryIndex(page, timeout_ms=MAX_WAIT_MS),
+                     governor=Governor(action.max_concurrency(args), enabled=args.governor), journal=journal,
+                     stop=stop, endpoint=endpoint, resources=rfilter)
+
+    if args.reuse_tab:
+        state.tabs = TabPool(context, args.reuse_tab, rfilter)
+    if args.open_by == "url":
+        state.edit_url_template = args.edit_url_template or await read_edit_url_template(page)
+        print(f"[INFO] Form dibuka lewat URL: {state.edit_url_template} ({endpoint})")
+    elif not args.all_pages:
+        with PROFILER.span("INDEX_TABLE"):
+            n = await state.directory.refresh()
+        print(f"[INFO] Tabel direktori terindeks: {n} baris ({endpoint})")
+    return state
+
+
+async def run_shard(state: RunState, rows: list[ExcelRow], start_idx: int) -> dict[int, str]:
+    try:
+        results = await state.action.run_rows(state, rows, start_idx)
+        if state.args.lock_retry_max > 0:
+            await retry_locked(state, rows, results, start_idx)
+    finally:
+        if state.tabs:
+            await state.tabs.close()
+    return results
+
+
+def load_rows(action: RowAction, args, search_dir: Path) -> tuple[pd.DataFrame, int, int]:
+    """Tahap load: pilih & baca Excel, cek kolom yang dibutuhkan aksi dan --match-by/--open-by, rentang baris."""
+    selection = resolve_excel(args.excel, search_dir=search_dir, sheet_index=args.sheet)
+    df = load_dataframe(selection, use_cache=not args.no_cache)
+
+    ensure_required_columns(df, action.required_columns)
+    if args.match_by == "idsbr" and "IDSBR" not in df.columns:
+        raise RuntimeError("Match by 'idsbr' dipilih tapi kolom 'IDSBR' tidak ada di Excel")
+    if args.match_by == "name" and "Nama" not in df.columns:
+        raise RuntimeError("Match by 'name' dipilih tapi kolom 'Nama' tidak ada di Excel")
+    if args.open_by == "url" and "IDSBR" not in df.columns:
+        raise RuntimeError("Open by 'url' dipilih tapi kolom 'IDSBR' tidak ada di Excel")
+
+    # Rentang baris (1-indexed → 0-based)
+    start_idx, end_idx = slice_rows(df, args.start, args.end)
+    return df, start_idx, end_idx
+
+
+def write_outcomes(path, rows: list[ExcelRow], states: list[RunState]) -> None:
+    """Hasil akhir per baris/IDSBR (kode terakhir, jumlah percobaan, detail respons)."""
+    outcomes = {i: o for st in states for i, o in st.outcomes.items()}
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(["baris", "idsbr", "nama", "hasil", "percobaan", "detail"])
+        for r in rows:
+            if r.index in outcomes:
+                code, detail, attempts = outcomes[r.index]
+                w.writerow([r.index + 1, r.idsbr, r.nama, code, attempts, detail])
+
+
+async def run_pipeline(action: RowAction, args, rows: list[ExcelRow], start_idx: int,
+                       journal: Journal | None = None) -> tuple[dict[int, str], LogSink]:
+    """
+    Jalankan aksi atas `rows`: tiap endpoint CDP / file sesi (akun profiler berbeda) memegang satu
+    shard baris; log & jurnal dipakai bersama. Ringkasan profiler/governor/filter dicetak di akhir.
+    """
+    global SLOW_MODE
+    SLOW_MODE = args.slow_mode
+
+    results = {}
+    states = []
+    sink = LogSink(action.log_csv)   # log ditulis per event; aman walau run berhenti di tengah
+    try:
+        async with async_playwright() as p:
+            stop = asyncio.Event()
+            for endpoint in args.headless or args.cdp:
+                states.append(await open_run_state(p, endpoint, action, args, sink, journal, stop))
+            shards = [rows[k::len(states)] for k in range(len(states))]
+            if len(states) > 1:
+                print("[INFO] Shard: " + ", ".join(f"{st.endpoint}={len(part)} baris" for st, part in zip(states, shards)))
+            for part in await asyncio.gather(*(run_shard(st, part, start_idx) for st, part in zip(states, shards))):
+                results.update(part)
+    finally:
+        sink.close()
+        if journal:
+            journal.close()
+        if args.result_csv and states:
+            write_outcomes(args.result_csv, rows, states)
+
+    print(PROFILER.report())
+    for st in states:
+        if args.governor:
+            print(f"{st.governor.summary()} @ {st.endpoint}")
+        if st.resources:
+            print(f"{st.resources.summary()} @ {st.endpoint}")
+        if st.tabs:
+            print(f"{st.tabs.summary()} @ {st.endpoint}")
+    if args.trace:
+        PROFILER.write_trace(args.trace)
+        print(f"[INFO] Chrome trace tersimpan di: {args.trace} (buka di chrome://tracing / ui.perfetto.dev)")
+    if args.result_csv:
+        print(f"[INFO] Hasil per baris tersimpan di: {args.result_csv}")
+    return results, sink
+
+
+# ---------- Argumen bersama ----------
+
+def add_common_args(ap: argparse.ArgumentParser) -> None:
+    """Argumen sumber browser, Excel, pencocokan baris, pool dan instrumentasi yang sama untuk semua aksi."""
+    ap.add_argument("--cdp", nargs="+", default=[CDP_ENDPOINT], metavar="URL",
+                    help=f"Endpoint CDP Chrome (boleh lebih dari satu, dipisah spasi/koma); baris dibagi rata "
+                         f"antar endpoint (default {CDP_ENDPOINT})")
+    ap.add_argument("--headless", nargs="+", default=None, metavar="STATE",
+                    help="Jalankan Chromium headless sendiri dengan sesi hasil --export-state (boleh beberapa file = beberapa akun)")
+    ap.add_argument("--export-state", nargs="?", const=STATE_PATH, default=None, metavar="FILE",
+                    help=f"Simpan cookie/sesi Chrome yang sedang login (via --cdp) untuk --headless, lalu keluar "
+                         f"(default {STATE_PATH})")
+    ap.add_argument("--directory-url", default=None,
+                    help="URL halaman Direktori Usaha untuk --headless (default: URL saat --export-state)")
+    ap.add_argument("--block", action=argparse.BooleanOptionalAction, default=True,
+                    help="Blokir resource yang tidak dibutuhkan form (gambar, font, peta, analytics; default aktif)")
+    ap.add_argument("--block-types", default=",".join(BLOCK_RESOURCE_TYPES), metavar="TIPE,...",
+                    help=f"Tipe resource Playwright yang diblokir (default {','.join(BLOCK_RESOURCE_TYPES)}; "
+                         f"mis. tambah stylesheet)")
+    ap.add_argument("--block-url", action="append", default=[], metavar="REGEX",
+                    help="Tambahan pola URL/domain yang diblokir (boleh diulang; di Chrome yang di-attach hanya pola "
+                         "domain/path sederhana seperti cdn\\.contoh\\.com)")
+    ap.add_argument("--allow-url", action="append", default=[], metavar="REGEX",
+                    help="Pola URL yang selalu diteruskan walau tipe/domainnya diblokir (boleh diulang; hanya --headless)")
+    ap.add_argument("--excel", default=None, help="Path ke file Excel (opsional; bila kosong akan dicari otomatis)")
+    ap.add_argument("--sheet", type=int, default=SHEET_NAME, help="Index sheet Excel (default 0)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="Jangan pakai/isi cache Excel di folder .sbrcache (selalu baca ulang file xlsx)")
+    ap.add_argument("--start", type=int, default=None, help="Mulai dari baris ke- (1-indexed)")
+    ap.add_argument("--end", type=int, default=None, help="Sampai baris ke- (inklusif; default = semua)")
+    ap.add_argument("--match-by", choices=["index", "idsbr", "name"], default="index",
+                    help="Cara memilih tombol Edit: index (default), idsbr, atau name")
+    ap.add_argument("--stop-on-error", action="store_true",
+                    help="Berhenti di error pertama (default lanjut ke baris berikutnya).")
+    ap.add_argument("--slow-mode", action=argparse.BooleanOptionalAction, default=SLOW_MODE,
+                    help="Beri jeda antar langkah agar proses mudah diamati (default: tanpa jeda, menunggu sinyal halaman)")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Jumlah tab form yang diproses bersamaan (default 1)")
+    ap.add_argument("--retries", type=int, default=0,
+                    help="Coba ulang baris yang gagal sementara (tab/respons tidak muncul, HTTP 5xx) dengan jeda "
+                         f"{RETRY_BASE_S}, {RETRY_BASE_S * 2}, ... detik")
+    ap.add_argument("--open-by", choices=["click", "url"], default="click",
+                    help="Cara membuka form: click (tombol Edit di tabel, default) atau url (langsung per IDSBR)")
+    ap.add_argument("--reuse-tab", type=int, default=0, metavar="N",
+                    help="Pakai ulang satu tab form per worker (navigasi ke URL form baris berikutnya, memakai "
+                         "--open-by url); tab diganti baru setiap N baris (default 0 = tab baru per baris)")
+    ap.add_argument("--edit-url-template", default=None,
+                    help="Pola URL form dengan placeholder {idsbr} (opsional; default dibaca dari tombol Edit)")
+    ap.add_argument("--all-pages", action="store_true",
+                    help="Telusuri semua halaman tabel direktori otomatis (pagination DataTables)")
+    ap.add_argument("--governor", action=argparse.BooleanOptionalAction, default=True,
+                    help="Atur paralelisme & jeda otomatis dari respons server (AIMD; default aktif)")
+    ap.add_argument("--lock-retry-max", type=int, default=LOCK_RETRY_TOTAL_S, metavar="DETIK",
+                    help=f"Total waktu mencoba ulang baris yang terkunci user lain setelah putaran utama "
+                         f"(default {LOCK_RETRY_TOTAL_S}; 0 = tanpa coba ulang)")
+    ap.add_argument("--result-csv", default=None, metavar="FILE",
+                    help="Simpan hasil akhir per baris/IDSBR (kode, jumlah percobaan, detail) ke file CSV")
+    ap.add_argument("--trace", default=None, metavar="FILE",
+                    help="Simpan durasi tiap tahap sebagai Chrome trace JSON (chrome://tracing / ui.perfetto.dev)")
+
+
+def check_common_args(ap: argparse.ArgumentParser, args) -> None:
+    args.cdp = [u.strip() for arg in args.cdp for u in arg.split(",") if u.strip()]
+    if not args.cdp:
+        ap.error("--cdp minimal satu endpoint")
+    if args.workers < 1:
+        ap.error("--workers minimal 1")
+    if args.retries < 0:
+        ap.error("--retries tidak boleh negatif")
+    if args.edit_url_template and "{idsbr}" not in args.edit_url_template:
+        ap.error("--edit-url-template harus memuat placeholder {idsbr}")
+    if args.reuse_tab < 0:
+        ap.error("--reuse-tab tidak boleh negatif")
+    if args.reuse_tab and args.all_pages:
+        ap.error("--reuse-tab membuka form lewat URL dan tidak bisa digabung dengan --all-pages")
+    if args.edit_url_template or args.reuse_tab:
+        args.open_by = "url"
+    if args.all_pages and args.open_by == "url":
+        ap.error("--all-pages hanya berlaku untuk --open-by click")
@@ -1,276 +1,32 @@
 import asyncio
 import argparse
+import csv
 import re
+import time
 from pathlib import Path
-from datetime import datetime
-from dataclasses import dataclass
-import pandas as pd
-from playwright.async_api import async_playwright, Error as PWError, Page, BrowserContext
+from playwright.async_api import async_playwright, Error as PWError, Page, TimeoutError as PWTimeout
+from sbrcore import (PROFILER, STATUS_ID_MAP, DirectoryCursor, DirectoryIndex, ExcelRow, Governor, Journal, iter_rows,
+                     last_stage_by_row, log_event, match_pending, norm_phone_str, normfloat_str, normspace,
+                     read_log_history, rejected_rows, seconds_per_row)
+from sbrengine import (FORM_READY_SELECTOR, MAX_WAIT_MS, RowAction, RunState, add_common_args, check_common_args,
+                       export_state, first_signal, load_rows, open_directory_page, pending_key, process_rows,
+                       read_edit_url_template, run_attempts, run_pipeline, safe_screenshot, slow_pause, try_click,
+                       vlog)
+from sbrhttp import (SHAPE_PATH, HttpRowError, HttpSubmitter, SessionExpired, SubmitShape, classify_response, httpx,
+                     is_submit_failure, response_detail, transport_error_code, verify_shape)
 
 # ====== KONFIGURASI DEFAULT ======
 
-# Chrome dibuka dengan --remote-debugging-port=9222
-CDP_ENDPOINT = "http://localhost:9222"
-SHEET_NAME = 0
 REQUIRED_COLUMNS_AUTOFILL = ("Status", "Email", "Sumber", "Catatan")
-PAUSE_AFTER_EDIT_CLICK_MS = 1000
 PAUSE_AFTER_SUBMIT_CLICK_MS = 300
-MAX_WAIT_MS = 5000
 LOG_CSV = "log_sbr_autofill.csv"
+JOURNAL_PATH = "journal_sbr_autofill.jsonl"
+REJECTS_CSV = "rejects_sbr_autofill.csv"
+PLAN_CSV = "plan_sbr_autofill.csv"
+DEFAULT_ROW_SECONDS = 15.0   # estimasi per baris bila log run sebelumnya belum ada
 SCREENSHOT_DIR = Path("screenshots")
-SCREENSHOT_DIR.mkdir(exist_ok=True)
-SLOW_MODE = True
-STEP_DELAY_MS = 700
-VERBOSE = True
-STATUS_ID_MAP = {
-    "Aktif": "kondisi_aktif",
-    "Tutup Sementara": "kondisi_tutup_sementara",
-    "Belum Beroperasi/Berproduksi": "kondisi_belum_beroperasi_berproduksi",
-    "Tutup": "kondisi_tutup",
-    "Alih Usaha": "kondisi_alih_usaha",
-    "Tidak Ditemukan": "kondisi_tidak_ditemukan",
-    "Aktif Pindah": "kondisi_aktif_pindah",
-    "Aktif Nonrespon": "kondisi_aktif_nonrespon",
-    "Duplikat": "kondisi_duplikat",
-    "Salah Kode Wilayah": "kondisi_salah_kode_wilayah",
-}
-
-@dataclass
-class ExcelSelection:
-    path: Path
-    sheet_index: int = 0
-
-
-def _format_candidates(paths):
-    return ", ".join(str(p) for p in paths)
-
-
-def resolve_excel(path_arg: str | None, search_dir: Path, sheet_index: int) -> ExcelSelection:
-    """
-    Jika --excel diberikan -> pakai itu.
-    Jika tidak -> cari *.xlsx di search_dir dan search_dir/data (harus 1 file).
-    """
-    if path_arg:
-        p = Path(path_arg).expanduser().resolve()
-        if not p.is_file():
-            raise FileNotFoundError(f"File Excel tidak ditemukan: {p}")
-        return ExcelSelection(path=p, sheet_index=sheet_index)
-
-    locations = [search_dir]
-    seen, candidates = set(), []
-    for loc in locations:
-        if not loc.exists():
-            continue
-        for c in sorted(loc.glob("*.xlsx")):
-            r = c.resolve()
-            if r not in seen:
-                seen.add(r)
-                candidates.append(r)
-
-    if not candidates:
-        raise FileNotFoundError(
-            "Gunakan argumen --excel untuk memilih file secara eksplisit."
-        )
-    if len(candidates) > 1:
-        raise RuntimeError(
-            "Ditemukan lebih dari satu file Excel. Pilih salah satu dengan --excel. Kandidat: "
-            f"{_format_candidates(candidates)}"
-        )
-    return ExcelSelection(path=candidates[0], sheet_index=sheet_index)
-
-
-def load_dataframe(selection: ExcelSelection, dtype: dict | str | None = str) -> pd.DataFrame:
-    return pd.read_excel(selection.path, sheet_name=selection.sheet_index, dtype=dtype)
-
-
-def ensure_required_columns(df: pd.DataFrame, required=REQUIRED_COLUMNS_AUTOFILL) -> None:
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        raise RuntimeError(f"Kolom wajib belum ada di Excel: {', '.join(missing)}")
-
-
-def slice_rows(df: pd.DataFrame, start: int | None, end: int | None) -> tuple[int, int]:
-    start_idx = 0 if start is None else max(start - 1, 0)
-    end_idx = len(df) if end is None else min(end, len(df))
-    return start_idx, end_idx
-
-
-def vlog(msg: str) -> None:
-    if VERBOSE:
-        print(msg)
-
-
-async def slow_pause(page: Page, ms: int | None = None):
-    """Berhenti sejenak untuk memberi waktu observasi di layar."""
-    if SLOW_MODE:
-        await page.wait_for_timeout(ms or STEP_DELAY_MS)
-
-
-def ts() -> str:
-    return datetime.now().strftime("%Y%m%d_%H%M%S")
-
-
-def normspace(s) -> str:
-    if s is None or (isinstance(s, float) and pd.isna(s)) or pd.isna(s):
-        return ""
-    return re.sub(r"\s+", " ", str(s)).strip()
-
-
-def norm_phone_str(v) -> str:
-    if v is None or (isinstance(v, float) and pd.isna(v)) or pd.isna(v):
-        return ""
-    return "".join(re.findall(r"\d", str(v)))  # hanya digit
-
-
-def normfloat_str(s: str) -> str:
-    s = normspace(s)
-    if not s:
-        return ""
-    s = s.replace(",", ".")
-    m = re.search(r"-?\d+(?:\.\d+)?", s)
-    return m.group(0) if m else ""
-
-
-async def safe_screenshot(page: Page, label: str) -> str:
-    try:
-        safe_label = re.sub(r"[^a-zA-Z0-9*-]+", "-", label)[:50]
-        fname = SCREENSHOT_DIR / f"{ts()}*{safe_label}.png"
-        await page.screenshot(path=str(fname), full_page=True)
-        return str(fname)
-    except Exception:
-        return ""
-
-
-def log_event(logs, row_idx: int, level: str, stage: str, note: str, screenshot: str = ""):
-    entry = {
-        "ts": ts(),
-        "row_index": row_idx,
-        "level": level,        # "OK" | "WARN" | "ERROR"
-        "stage": stage,        # e.g. CLICK_EDIT / OPEN_TAB / FILL / SUBMIT / CONFIRM_SUBMIT
-        "note": note,
-        "screenshot": screenshot,
-    }
-    logs.append(entry)
-    tag = "!" if level != "OK" else "-"
-    print(f"  {tag} [{level}] {stage}: {note}" + (f" (ss: {screenshot})" if screenshot else ""))
-
-
-async def ensure_click(locator, name: str = "element"):
-    await locator.wait_for(state="visible", timeout=MAX_WAIT_MS)
-    await locator.click()
-
-
-async def get_active_directory_page(ctx: BrowserContext) -> Page:
-    pages = ctx.pages
-    if not pages:
-        raise RuntimeError("Tidak ada tab terbuka. Pastikan Chrome sudah membuka halaman Direktori Usaha.")
-    return pages[-1]
-
-
-async def is_edit_locked_page(p: Page) -> bool:
-    try:
-        await p.wait_for_load_state("domcontentloaded", timeout=2500)
-    except Exception:
-        pass
-
-    checks = [
-        # teks utama yang muncul pada UI
-        re.compile(r"sedang\s+diedit\s+oleh\s+user\s+lain", re.I),
-        re.compile(r"tidak\s+bisa\s+melakukan\s+edit", re.I),
-        re.compile(r"Not\s+Authorized", re.I),
-        re.compile(r"Profiling\s+Info", re.I),  # judul halaman
-        re.compile(r"Back\s+to\s+Home", re.I),
-    ]
-
-    # 1) cek title cepat
-    try:
-        title = (await p.title()) or ""
-        if any(r.search(title) for r in checks):
-            return True
-    except Exception:
-        pass
-
-    # 2) cek konten halaman
-    try:
-        locator = p.get_by_text(re.compile(r"sedang\s+edit|Not\s+Authorized|Back\s+to\s+Home|Profiling\s+Info", re.I))
-        if await locator.count() > 0:
-            try:
-                await locator.first.wait_for(state="visible", timeout=600)
-            except Exception:
-                pass
-            return True
-    except Exception:
-        pass
-
-    # 3) fallback: lihat URL pattern yang biasa muncul
-    try:
-        url = p.url or ""
-        if re.search(r"not-?authorized", url, re.I):
-            return True
-    except Exception:
-        pass
-
-    return False
-
-
-async def click_edit_by_index(page: Page, index0: int) -> bool:
-    table = page.locator("#table_direktori_usaha")
-    await table.wait_for(state="visible", timeout=MAX_WAIT_MS)
-    rows = table.locator("tbody > tr")
-    if index0 >= await rows.count():
-        return False
-    row = rows.nth(index0)
-    btn = row.locator("css=td >> div.d-flex.align-items-center.col-actions >> a.btn-edit-perusahaan").first
-    if await btn.count() == 0:
-        btn = row.locator(f"xpath=//*[@id='table_direktori_usaha']/tbody/tr[{index0+1}]/td[10]/div/a[1]")
-
-    for _ in range(3):
-        try:
-            await btn.scroll_into_view_if_needed()
-            await btn.click()
-            return True
-        except Exception:
-            await page.evaluate("() => document.querySelectorAll('.tooltip,.modal-backdrop').forEach(e=>e.remove())")
-            await page.wait_for_timeout(150)
-    return False
-
-
-async def click_edit_by_text(page: Page, text: str) -> bool:
-    """
-    Klik tombol Edit pada baris yang mengandung teks 'text' (IDSBR/Nama)
-    di salah satu sel <td>. Cocok saat kamu pakai --match-by idsbr / name.
-    """
-    text = normspace(text)
-    if not text:
-        return False
-
-    table = page.locator("#table_direktori_usaha")
-    await table.wait_for(state="visible", timeout=MAX_WAIT_MS)
-
-    # Cari <tr> yang punya <td> berisi teks tsb (case-insensitive)
-    row = table.locator("tbody tr").filter(has_text=re.compile(re.escape(text), re.I)).first
-
-    try:
-        await row.wait_for(state="visible", timeout=MAX_WAIT_MS)
-    except Exception:
-        return False
-
-    # Tombol Edit di kolom aksi
-    btn = row.locator("css=td >> div.d-flex.align-items-center.col-actions >> a.btn-edit-perusahaan").first
-    if await btn.count() > 0:
-        await btn.scroll_into_view_if_needed()
-        await ensure_click(btn, name="Edit by text")
-        return True
-
-    # Fallback: tombol <a> pertama di kolom aksi
-    btn2 = row.locator("xpath=.//td[div[contains(@class,'col-actions')]]//a[1]")
-    if await btn2.count() > 0:
-        await btn2.scroll_into_view_if_needed()
-        await ensure_click(btn2, name="Edit by text (fallback xpath)")
-        return True
-
-    return False
-
+SUBMIT_URL_RE = re.compile(r"submit", re.I)   # endpoint Submit Final bila bentuk request belum direkam
+LOCKED_STAGES = ("EDIT_LOCKED", "LOCK_GAVE_UP")   # stage terakhir di log yang berarti baris masih terkunci
 
 async def fill_form(
     new_page: Page,
@@ -280,13 +36,18 @@ async def fill_form(
     lat_val: str,
     lon_val: str,
     sumber: str,
-    catatan: str
+    catatan: str,
+    only: set[str] | None = None,
 ):
+    """Isi form lewat locator Playwright. `only` membatasi field yang diisi (dipakai sebagai fallback fast-fill)."""
+
+    def want(field_name: str) -> bool:
+        return only is None or field_name in only
 
     print("  Mulai mengisi form...")
 
     # 1. Keberadaan usaha/perusahaan — versi simple & pasti
-    if status_label:
+    if status_label and want("status"):
         label_clean = normspace(status_label)
         radio_id = STATUS_ID_MAP.get(label_clean)
 
@@ -326,117 +87,121 @@ async def fill_form(
 
         # Nomor Telepon
         phone_clean = norm_phone_str(phone_val)
-        tel_input = (
-            new_page.get_by_placeholder(re.compile(r"^Nomor\s*Telepon$", re.I))
-            .or_(new_page.locator("input#nomor_telepon, input[name='nomor_telepon'], input[name='no_telp'], input[name='telepon']"))
-        ).first
-        await tel_input.wait_for(state="visible", timeout=1500)
-
-        if phone_clean:
-            await tel_input.fill("")
-            await tel_input.fill(phone_clean)
-            print(f"    Nomor Telepon diisi: {phone_clean}")
-        else:
-            print("    Nomor Telepon dilewati (Excel kosong/tidak valid).")
+        if want("phone"):
+            tel_input = (
+                new_page.get_by_placeholder(re.compile(r"^Nomor\s*Telepon$", re.I))
+                .or_(new_page.locator("input#nomor_telepon, input[name='nomor_telepon'], input[name='no_telp'], input[name='telepon']"))
+            ).first
+            await tel_input.wait_for(state="visible", timeout=1500)
+
+            if phone_clean:
+                await tel_input.fill("")
+                await tel_input.fill(phone_clean)
+                print(f"    Nomor Telepon diisi: {phone_clean}")
+            else:
+                print("    Nomor Telepon dilewati (Excel kosong/tidak valid).")
 
         # --- Toggle & input Email (logika: hanya uncheck bila web & Excel kosong) ---
-        cb_email = new_page.locator("#check-email").first
-        await cb_email.wait_for(state="attached", timeout=500)
-
-        email_input = (
-            new_page.locator("input#email, input[name='email'], input[type='email']")
-            .or_(new_page.get_by_placeholder(re.compile(r"^email$", re.I)))
-        ).first
-
-        # Baca nilai email yang sudah ada di web
-        web_state = await new_page.evaluate("""
-            () => {
-                const inp = document.querySelector('input#email, input[name="email"], input[type="email"]');
-                return { value: inp ? (inp.value || '').trim() : '' };
-            }
-        """)
-
-        web_value = (web_state.get("value") or "").strip()
-        excel_value = (email_val or "").strip()
-
-        # 1. Jika Excel punya email → isi ulang (toggle dibiarkan menyala)
-        if excel_value:
-            try:
-                await email_input.wait_for(state="visible", timeout=400)
-                await email_input.fill("")
-                await email_input.fill(excel_value)
-                print(f"    Email diisi: {excel_value}")
-            except Exception as e:
-                print(f"    Gagal mengisi email: {e}")
-
-        # 2. Jika web sudah berisi email dan Excel kosong → biarkan toggle menyala
-        elif web_value:
-            print(f"    Email di web sudah ada, toggle dibiarkan aktif: {web_value}")
-
-        # 3. Jika keduanya kosong → matikan toggle dan kosongkan input
-        else:
-            try:
-                await new_page.evaluate("""
-                    () => {
-                        const cb = document.querySelector('#check-email');
-                        const inp = document.querySelector('input#email, input[name="email"], input[type="email"]');
-                        if (cb) {
-                            cb.checked = false;
-                            cb.dispatchEvent(new Event('input', {bubbles:true}));
-                            cb.dispatchEvent(new Event('change', {bubbles:true}));
-                        }
-                        if (inp) {
-                            inp.value = '';
-                            inp.dispatchEvent(new Event('input', {bubbles:true}));
-                            inp.dispatchEvent(new Event('change', {bubbles:true}));
+        if want("email"):
+            cb_email = new_page.locator("#check-email").first
+            await cb_email.wait_for(state="attached", timeout=500)
+
+            email_input = (
+                new_page.locator("input#email, input[name='email'], input[type='email']")
+                .or_(new_page.get_by_placeholder(re.compile(r"^email$", re.I)))
+            ).first
+
+            # Baca nilai email yang sudah ada di web
+            web_state = await new_page.evaluate("""
+                () => {
+                    const inp = document.querySelector('input#email, input[name="email"], input[type="email"]');
+                    return { value: inp ? (inp.value || '').trim() : '' };
+                }
+            """)
+
+            web_value = (web_state.get("value") or "").strip()
+            excel_value = (email_val or "").strip()
+
+            # 1. Jika Excel punya email → isi ulang (toggle dibiarkan menyala)
+            if excel_value:
+                try:
+                    await email_input.wait_for(state="visible", timeout=400)
+                    await email_input.fill("")
+                    await email_input.fill(excel_value)
+                    print(f"    Email diisi: {excel_value}")
+                except Exception as e:
+                    print(f"    Gagal mengisi email: {e}")
+
+            # 2. Jika web sudah berisi email dan Excel kosong → biarkan toggle menyala
+            elif web_value:
+                print(f"    Email di web sudah ada, toggle dibiarkan aktif: {web_value}")
+
+            # 3. Jika keduanya kosong → matikan toggle dan kosongkan input
+            else:
+                try:
+                    await new_page.evaluate("""
+                        () => {
+                            const cb = document.querySelector('#check-email');
+                            const inp = document.querySelector('input#email, input[name="email"], input[type="email"]');
+                            if (cb) {
+                                cb.checked = false;
+                                cb.dispatchEvent(new Event('input', {bubbles:true}));
+                                cb.dispatchEvent(new Event('change', {bubbles:true}));
+                            }
+                            if (inp) {
+                                inp.value = '';
+                                inp.dispatchEvent(new Event('input', {bubbles:true}));
+                                inp.dispatchEvent(new Event('change', {bubbles:true}));
+                            }
                         }
-                    }
-                """)
-                print("    Toggle email dinonaktifkan (web & Excel kosong).")
-            except Exception as e:
-                print(f"    Gagal menonaktifkan toggle email: {e}")
+                    """)
+                    print("    Toggle email dinonaktifkan (web & Excel kosong).")
+                except Exception as e:
+                    print(f"    Gagal menonaktifkan toggle email: {e}")
 
         # Latitude & Longitude
         lat_clean = normfloat_str(lat_val)
         lon_clean = normfloat_str(lon_val)
 
         # Latitude
-        if lat_clean:
-            try:
-                lat_input = (
-                    new_page.locator("input#latitude, input[name='latitude']").first
-                    .or_(new_page.get_by_placeholder(re.compile(r"^latitude", re.I)))
-                )
-                await lat_input.wait_for(state="visible", timeout=1500)
-                await lat_input.fill("")          # bersihkan dulu
-                await lat_input.fill(lat_clean)
-                print(f"    Latitude diisi: {lat_clean}")
-            except Exception as e:
-                print(f"    Gagal isi Latitude: {e}")
-        else:
-            print("    Latitude dilewati (Excel kosong/tidak valid).")
+        if want("lat"):
+            if lat_clean:
+                try:
+                    lat_input = (
+                        new_page.locator("input#latitude, input[name='latitude']").first
+                        .or_(new_page.get_by_placeholder(re.compile(r"^latitude", re.I)))
+                    )
+                    await lat_input.wait_for(state="visible", timeout=1500)
+                    await lat_input.fill("")          # bersihkan dulu
+                    await lat_input.fill(lat_clean)
+                    print(f"    Latitude diisi: {lat_clean}")
+                except Exception as e:
+                    print(f"    Gagal isi Latitude: {e}")
+            else:
+                print("    Latitude dilewati (Excel kosong/tidak valid).")
 
         # Longitude
-        if lon_clean:
-            try:
-                lon_input = (
-                    new_page.locator("input#longitude, input[name='longitude']").first
-                    .or_(new_page.get_by_placeholder(re.compile(r"^longitude", re.I)))
-                )
-                await lon_input.wait_for(state="visible", timeout=1500)
-                await lon_input.fill("")          # bersihkan dulu
-                await lon_input.fill(lon_clean)
-                print(f"    Longitude diisi: {lon_clean}")
-            except Exception as e:
-                print(f"    Gagal isi Longitude: {e}")
-        else:
-            print("    Longitude dilewati (Excel kosong/tidak valid).")
+        if want("lon"):
+            if lon_clean:
+                try:
+                    lon_input = (
+                        new_page.locator("input#longitude, input[name='longitude']").first
+                        .or_(new_page.get_by_placeholder(re.compile(r"^longitude", re.I)))
+                    )
+                    await lon_input.wait_for(state="visible", timeout=1500)
+                    await lon_input.fill("")          # bersihkan dulu
+                    await lon_input.fill(lon_clean)
+                    print(f"    Longitude diisi: {lon_clean}")
+                except Exception as e:
+                    print(f"    Gagal isi Longitude: {e}")
+            else:
+                print("    Longitude dilewati (Excel kosong/tidak valid).")
 
     except Exception as e:
         print(f"    Pengisian telp/email/lat/lon bermasalah: {e}")
 
     # 3. Isi sumber profiling
-    if sumber:
+    if sumber and want("sumber"):
         try:
             await new_page.get_by_placeholder(re.compile("Sumber Profiling", re.I)).fill(sumber)
             print(f"    Sumber Profiling diisi: {sumber}")
@@ -445,7 +210,7 @@ async def fill_form(
         await slow_pause(new_page)
 
     # 4. Isi catatan profiling
-    if catatan:
+    if catatan and want("catatan"):
         try:
             await new_page.wait_for_selector("#catatan_profiling", state="visible", timeout=3000)
             await new_page.fill("#catatan_profiling", catatan)
@@ -466,53 +231,275 @@ async def fill_form(
     print("  Form selesai diisi.")
 
 
-async def try_click(locator, visible_ms=800):
+# Satu page.evaluate untuk seluruh field. Tiap field melapor:
+# "ok" (diisi), "skip" (nilai Excel kosong), "kept" (email web dipertahankan),
+# "cleared" (toggle email dimatikan), "missing" (elemen tidak ada/tersembunyi -> fallback locator).
+FAST_FILL_JS = """
+(v) => {
+    const visible = (el) => !!el && !el.disabled && el.getClientRects().length > 0;
+    const setValue = (el, value) => {
+        const proto = el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+        Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+    };
+    const fillInput = (selector, value) => {
+        if (!value) return 'skip';
+        const el = document.querySelector(selector);
+        if (!visible(el)) return 'missing';
+        setValue(el, value);
+        return 'ok';
+    };
+    const res = {};
+
+    if (!v.status) res.status = 'skip';
+    else {
+        const radio = v.status_id ? document.getElementById(v.status_id) : null;
+        if (!radio) res.status = 'missing';
+        else {
+            if (!radio.checked) radio.click();
+            res.status = radio.checked ? 'ok' : 'missing';
+        }
+    }
+
+    res.phone = fillInput(
+        "input#nomor_telepon, input[name='nomor_telepon'], input[name='no_telp'], input[name='telepon'], "
+        + "input[placeholder='Nomor Telepon' i]", v.phone);
+
+    const cb = document.querySelector('#check-email');
+    const email = document.querySelector('input#email, input[name="email"], input[type="email"]');
+    if (!cb || !email) res.email = 'missing';
+    else if (v.email) {
+        if (!cb.checked) cb.click();
+        if (!visible(email)) res.email = 'missing';
+        else { setValue(email, v.email); res.email = 'ok'; }
+    } else if ((email.value || '').trim()) res.email = 'kept';
+    else {
+        cb.checked = false;
+        cb.dispatchEvent(new Event('input', {bubbles: true}));
+        cb.dispatchEvent(new Event('change', {bubbles: true}));
+        setValue(email, '');
+        res.email = 'cleared';
+    }
+
+    res.lat = fillInput("input#latitude, input[name='latitude'], input[placeholder^='latitude' i]", v.lat);
+    res.lon = fillInput("input#longitude, input[name='longitude'], input[placeholder^='longitude' i]", v.lon);
+    res.sumber = fillInput(
+        "input[placeholder*='Sumber Profiling' i], textarea[placeholder*='Sumber Profiling' i]", v.sumber);
+    res.catatan = fillInput('#catatan_profiling', v.catatan);
+    return res;
+}
+"""
+async def fill_form_fast(new_page: Page, row: ExcelRow) -> dict:
+    """Isi seluruh field dalam satu round trip; kembalikan hasil per field (lihat FAST_FILL_JS)."""
+    await new_page.locator(FORM_READY_SELECTOR).first.wait_for(state="attached", timeout=MAX_WAIT_MS)
+    status = normspace(row.status)
+    payload = {
+        "status": status,
+        "status_id": STATUS_ID_MAP.get(status, ""),
+        "phone": norm_phone_str(row.phone),
+        "email": (row.email or "").strip(),
+        "lat": normfloat_str(row.lat),
+        "lon": normfloat_str(row.lon),
+        "sumber": row.sumber,
+        "catatan": row.catatan,
+    }
+    return await new_page.evaluate(FAST_FILL_JS, payload)
+
+
+# Nilai form saat ini (satu evaluate) untuk mode --skip-unchanged
+READ_FORM_JS = """
+() => {
+    const val = (selector) => {
+        const el = document.querySelector(selector);
+        return el ? (el.value || '').trim() : null;
+    };
+    const radio = document.querySelector("input[id^='kondisi_']:checked");
+    const cb = document.querySelector('#check-email');
+    return {
+        status_id: radio ? radio.id : '',
+        phone: val("input#nomor_telepon, input[name='nomor_telepon'], input[name='no_telp'], input[name='telepon'], "
+                   + "input[placeholder='Nomor Telepon' i]"),
+        email: cb && !cb.checked ? '' : val('input#email, input[name="email"], input[type="email"]'),
+        lat: val("input#latitude, input[name='latitude'], input[placeholder^='latitude' i]"),
+        lon: val("input#longitude, input[name='longitude'], input[placeholder^='longitude' i]"),
+        sumber: val("input[placeholder*='Sumber Profiling' i], textarea[placeholder*='Sumber Profiling' i]"),
+        catatan: val('#catatan_profiling'),
+    };
+}
+"""
+
+
+def form_diff(row: ExcelRow, current: dict) -> list[str]:
+    """
+    Field yang nilainya di Excel berbeda dengan form. Nilai Excel kosong tidak dihitung
+    (fill_form juga tidak menyentuhnya); field yang tidak terbaca di form dianggap berbeda.
+    """
+    def same_float(a: str, b: str | None) -> bool:
+        try:
+            return abs(float(a) - float(normfloat_str(b))) < 1e-7
+        except (TypeError, ValueError):
+            return False
+
+    status = normspace(row.status)
+    checks = {
+        "status": (status, lambda v: STATUS_ID_MAP.get(status) == current.get("status_id")),
+        "phone": (norm_phone_str(row.phone), lambda v: v == norm_phone_str(current.get("phone"))),
+        "email": ((row.email or "").strip(), lambda v: v.lower() == (current.get("email") or "").lower()),
+        "lat": (normfloat_str(row.lat), lambda v: same_float(v, current.get("lat"))),
+        "lon": (normfloat_str(row.lon), lambda v: same_float(v, current.get("lon"))),
+        "sumber": (normspace(row.sumber), lambda v: v == normspace(current.get("sumber"))),
+        "catatan": (normspace(row.catatan), lambda v: v == normspace(current.get("catatan"))),
+    }
+    return [name for name, (value, same) in checks.items() if value and not same(value)]
+
+
+async def read_form_values(new_page: Page) -> dict:
+    await new_page.locator(FORM_READY_SELECTOR).first.wait_for(state="attached", timeout=MAX_WAIT_MS)
+    return await new_page.evaluate(READ_FORM_JS)
+
+
+async def fill_row(new_page: Page, row: ExcelRow, mode: str = "fast") -> str:
+    """
+    Isi form satu baris. Mode "fast" memakai fill_form_fast lalu hanya field yang
+    "missing" diulang lewat fill_form (locator); mode "locator" = perilaku lama.
+    Mengembalikan ringkasan untuk log.
+    """
+    fields = (row.status, row.phone, row.email, row.lat, row.lon, row.sumber, row.catatan)
+    if mode == "fast":
+        try:
+            res = await fill_form_fast(new_page, row)
+        except PWError as e:
+            vlog(f"    fast-fill gagal ({e}); pakai locator.")
+        else:
+            missing = {k for k, v in res.items() if v == "missing"}
+            summary = ", ".join(f"{k}={v}" for k, v in res.items())
+            print(f"    Fast-fill: {summary}")
+            if not missing:
+                await slow_pause(new_page)
+                return f"fast: {summary}"
+            await fill_form(new_page, *fields, only=missing)
+            return f"fast+locator({','.join(sorted(missing))}): {summary}"
+    await fill_form(new_page, *fields)
+    return "locator"
+
+
+def is_submit_request(req, shape: SubmitShape | None = None) -> bool:
+    """Endpoint Submit Final: path yang direkam di SubmitShape bila ada, selain itu POST ke URL berisi 'submit'."""
+    if shape is not None:
+        return shape.matches(req.method, req.url)
+    return req.method == "POST" and bool(SUBMIT_URL_RE.search(req.url))
+
+
+async def response_outcome(resp) -> tuple[str, str]:
+    """Hasil submit dari respons XHR: status HTTP + body (JSON/teks), kosakata sama dengan engine http."""
     try:
-        if await locator.is_visible(timeout=visible_ms):
-            await locator.click()
-            return True
-    except Exception:
-        pass
-    return False
-
-async def submit_and_handle(new_page: Page) -> str:
+        text = await resp.text()
+    except PWError:
+        text = ""
+    return classify_response(resp.status, text), response_detail(text)
+
+
+async def submit_and_handle(new_page: Page, shape: SubmitShape | None = None,
+                            governor: Governor | None = None) -> str:
+    """
+    Klik Submit Final lalu ambil hasil dari respons XHR submit (status, body JSON, galat validasi).
+    Modal Cek Konsistensi / Ya, Submit! ditangani begitu muncul. Respons sebelum konfirmasi hanya
+    dipakai bila gagal; OK hanya dari respons setelah klik "Ya, Submit!" atau, bila tidak ada
+    respons yang tertangkap, dari sinyal DOM (pesan sukses, toast, tombol hilang).
+    Hasil: OK | ERROR_FILL | KONSISTENSI | SESSION | HTTP_xxx | NO_SUCCESS_SIGNAL | NO_CONFIRM | NO_SUBMIT_BUTTON
+    Bila OK dari respons, latensi klik "Ya, Submit!" → respons dilaporkan ke `governor`.
+    """
+    responses = []
+    seen_at = {}
+    arrived = asyncio.Event()
+
+    def on_response(resp):
+        if is_submit_request(resp.request, shape):
+            seen_at[resp] = time.perf_counter()
+            responses.append(resp)
+            arrived.set()
+
+    new_page.on("response", on_response)
+    try:
+        return await _submit_flow(new_page, responses, seen_at, arrived, governor)
+    finally:
+        new_page.remove_listener("response", on_response)
+
+
+async def _submit_flow(new_page: Page, responses: list, seen_at: dict, arrived: asyncio.Event,
+                       governor: Governor | None) -> str:
     btn_role = new_page.get_by_role("button", name=re.compile("Submit Final", re.I))
     btn_text = new_page.locator("text=Submit Final").first
 
     if not (await try_click(btn_role) or await try_click(btn_text)):
         return "NO_SUBMIT_BUTTON"
 
-    await new_page.wait_for_timeout(PAUSE_AFTER_SUBMIT_CLICK_MS)
+    await slow_pause(new_page, PAUSE_AFTER_SUBMIT_CLICK_MS)
 
-    # galat pengisian
-    try:
-        err = new_page.get_by_text(re.compile("Masih terdapat isian yang harus diperbaiki", re.I))
-        await err.wait_for(state="visible", timeout=1000)
+    err = new_page.get_by_text(re.compile("Masih terdapat isian yang harus diperbaiki", re.I)).first
+    kons = new_page.get_by_text(re.compile("Cek Konsistensi", re.I)).first
+    ya = new_page.locator("div.modal.show, div[role='dialog']").locator(
+        "button:has-text('Ya, Submit'), a:has-text('Ya, Submit'), button:has-text('Ya, Submit!'), a:has-text('Ya, Submit!')"
+    ).first
+    modal = err.or_(kons).or_(ya).first
+
+    async def dismiss_ok():
         ok = new_page.get_by_role("button", name=re.compile("^OK$", re.I))
-        if await ok.is_visible():
-            await ok.click()
+        try:
+            if await ok.is_visible():
+                await ok.click(force=True)
+        except PWError:
+            pass
+
+    settled = {}
+
+    async def settle(resp, when: str = "") -> str:
+        if resp not in settled:
+            outcome, detail = await response_outcome(resp)
+            print(f"    Respons submit{when}: HTTP {resp.status} -> {outcome}" + (f" ({detail})" if detail else ""))
+            if outcome == "ERROR_FILL":
+                await dismiss_ok()
+            settled[resp] = outcome
+        return settled[resp]
+
+    # yang pertama: respons XHR atau modal (galat pengisian / cek konsistensi / konfirmasi)
+    first = await first_signal(
+        asyncio.wait_for(arrived.wait(), MAX_WAIT_MS / 1000),
+        modal.wait_for(state="visible", timeout=MAX_WAIT_MS),
+    )
+    if first == 0:
+        # respons sebelum konfirmasi (pre-check, animasi modal lambat) hanya final bila gagal
+        outcome = await settle(responses[-1], " (sebelum konfirmasi)")
+        if is_submit_failure(outcome):
+            return outcome
+        try:
+            await modal.wait_for(state="visible", timeout=MAX_WAIT_MS)
+        except PWError:
+            pass
+
+    # galat pengisian
+    if await err.is_visible():
+        await dismiss_ok()
         return "ERROR_FILL"
-    except Exception:
-        pass
 
-    # cek konsistensi → Ignore
-    try:
-        kons = new_page.get_by_text(re.compile("Cek Konsistensi", re.I))
-        await kons.wait_for(state="visible", timeout=800)
-        ign = new_page.get_by_role("button", name=re.compile("^Ignore$", re.I))
-        if await ign.is_visible():
-            await ign.click(force=True)
-            await new_page.wait_for_timeout(250)
-    except Exception:
-        pass
-
-    # konfirmasi "Ya, Submit!"
+    # cek konsistensi → Ignore, lalu tunggu dialog konfirmasi
+    if await kons.is_visible():
+        try:
+            ign = new_page.get_by_role("button", name=re.compile("^Ignore$", re.I))
+            if await ign.is_visible():
+                await ign.click(force=True)
+            await ya.wait_for(state="visible", timeout=MAX_WAIT_MS)
+        except Exception:
+            pass
+
+    # konfirmasi "Ya, Submit!" → hasil diambil dari respons XHR submit berikutnya
     clicked_confirm = False
-    for _ in range(10):
-        ya = new_page.locator("div.modal.show, div[role='dialog']").locator(
-            "button:has-text('Ya, Submit'), a:has-text('Ya, Submit'), button:has-text('Ya, Submit!'), a:has-text('Ya, Submit!')"
-        ).first
-        if await ya.count() > 0 and await ya.is_visible():
+    if await ya.is_visible():
+        responses.clear()
+        arrived.clear()
+        with PROFILER.span("CONFIRM"):
+            t_confirm = time.perf_counter()
             try:
                 await ya.click(force=True)
             except Exception:
@@ -525,253 +512,446 @@ async def submit_and_handle(new_page: Page) -> str:
                     }
                 """)
             clicked_confirm = True
-            break
-        await new_page.wait_for_timeout(250)
-
-    # sinyal sukses alternatif selain modal
-    async def submit_still_visible():
-        try:
-            if await btn_role.is_visible(timeout=200): return True
-        except Exception:
-            pass
-        try:
-            if await btn_text.is_visible(timeout=200): return True
-        except Exception:
-            pass
-        return False
+            try:
+                await asyncio.wait_for(arrived.wait(), MAX_WAIT_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+        if responses:
+            outcome = await settle(responses[-1])
+            if outcome == "OK" and governor:
+                governor.success(seen_at[responses[-1]] - t_confirm)
+            return outcome
+    elif responses and is_submit_failure(outcome := await settle(responses[-1], " (sebelum konfirmasi)")):
+        return outcome
+
+    # cadangan tanpa respons XHR: pesan sukses / toast / tombol Submit Final hilang
+    sm = new_page.get_by_text(re.compile("Success|Berhasil submit data final", re.I)).first
+    toast = new_page.locator(".toast, .alert-success, .swal2-popup").first
+    signal = await first_signal(
+        sm.wait_for(state="visible", timeout=MAX_WAIT_MS),
+        toast.wait_for(state="visible", timeout=MAX_WAIT_MS),
+        btn_text.wait_for(state="hidden", timeout=MAX_WAIT_MS),
+    )
+    if signal == 0:
+        await dismiss_ok()
+
+    if signal is not None:
+        return "OK"
+    return "NO_SUCCESS_SIGNAL" if clicked_confirm else "NO_CONFIRM"
 
-    success_seen = False
-    for _ in range(16):
-        try:
-            sm = new_page.get_by_text(re.compile("Success|Berhasil submit data final", re.I))
-            if await sm.is_visible(timeout=120):
-                okb = new_page.get_by_role("button", name=re.compile("^OK$", re.I))
-                if await okb.is_visible():
-                    await okb.click(force=True)
-                    await new_page.wait_for_timeout(150)
-                success_seen = True
-                break
-        except Exception:
-            pass
 
-        toast = new_page.locator(".toast, .alert-success, .swal2-popup").first
-        try:
-            if await toast.is_visible(timeout=120):
-                success_seen = True
-                break
-        except Exception:
-            pass
+# ---------- Aksi isi form + Submit Final untuk pipeline sbrengine ----------
 
-        if not await submit_still_visible():
-            success_seen = True
-            break
+class FillAction(RowAction):
+    name = "fill"
+    log_csv = LOG_CSV
+    screenshot_dir = SCREENSHOT_DIR
+    required_columns = REQUIRED_COLUMNS_AUTOFILL
+    shape: SubmitShape | None = None   # endpoint Submit Final yang sudah direkam (--submit-shape)
 
-        await new_page.wait_for_timeout(200)
+    def heading(self, row: ExcelRow) -> str:
+        return f"=== Baris {row.index + 1} :: {row.nama} :: Status = {row.status} ==="
 
-    if success_seen:
-        return "OK"
-    return "NO_SUCCESS_SIGNAL" if clicked_confirm else "NO_CONFIRM"
+    def keep_open(self, code: str) -> bool:
+        return code == "ERROR_FILL"
 
+    def max_concurrency(self, args) -> int:
+        return args.http_concurrency if args.engine == "http" else args.workers
 
-async def run(args):
-    ok_count = 0
+    async def run_rows(self, state: RunState, rows: list[ExcelRow], start_idx: int) -> dict[int, str]:
+        if state.args.engine == "http":
+            return await run_http_shard(state, rows, start_idx)
+        shape_path = Path(state.args.submit_shape)
+        if self.shape is None and shape_path.exists():
+            self.shape = SubmitShape.load(shape_path)
+        return await process_rows(state, rows, start_idx)
 
-    # Tentukan lokasi pencarian: folder file script
-    base_dir = Path(__file__).resolve().parent
+    async def act(self, state: RunState, row: ExcelRow, form: Page) -> tuple[str, str]:
+        """Isi form lalu Submit Final. Hasil: OK | SKIPPED | ERROR | kode submit_and_handle."""
+        args, i = state.args, row.index
 
-    # Pilih file Excel otomatis (atau sesuai --excel) + load dataframe sebagai string
-    selection = resolve_excel(args.excel, search_dir=base_dir, sheet_index=args.sheet)
-    df = load_dataframe(selection, dtype=str)
+        def log(level: str, stage: str, note: str, screenshot: str = ""):
+            log_event(state.log, i+1, level, stage, note, screenshot, idsbr=row.idsbr)
 
-    # Validasi kolom wajib
-    ensure_required_columns(df, REQUIRED_COLUMNS_AUTOFILL)
+        # --- Mode diff: form sudah sama dengan Excel → tutup tanpa submit ---
+        if args.skip_unchanged:
+            try:
+                with PROFILER.span("READ_FORM"):
+                    changed = form_diff(row, await read_form_values(form))
+            except PWError as e:
+                changed = None
+                vlog(f"    Gagal membaca nilai form ({e}); tetap diisi.")
+            if changed == []:
+                log("OK", "SKIPPED_UNCHANGED", "Nilai form sudah sama dengan Excel, tidak di-submit")
+                state.journal.record(row.idsbr, row.hash, i+1, outcome="unchanged")
+                return "SKIPPED", ""
+            if changed:
+                print(f"    Field berubah: {', '.join(changed)}")
+
+        # --- Isi form ---
+        try:
+            with PROFILER.span("FILL"):
+                how = await fill_row(form, row, args.fill_mode)
+            log("OK", "FILL", f"Form terisi ({how})")
+        except Exception as e:
+            shot = await safe_screenshot(form, f"exception_fill_form_baris_{i+1}", self.screenshot_dir)
+            log("ERROR", "FILL", f"Exception isi form: {e}", shot)
+            return "ERROR", normspace(e)[:200]
 
-    # Validasi kolom untuk match-by
-    if args.match_by == "idsbr" and "IDSBR" not in df.columns:
-        raise RuntimeError("Match by 'idsbr' dipilih tapi kolom 'IDSBR' tidak ada di Excel")
-    if args.match_by == "name" and "Nama" not in df.columns:
-        raise RuntimeError("Match by 'name' dipilih tapi kolom 'Nama' tidak ada di Excel")
+        # --- Submit & handle ---
+        try:
+            with PROFILER.span("SUBMIT"):
+                result = await submit_and_handle(form, self.shape, state.governor)
+        except Exception as e:
+            if isinstance(e, PWTimeout):
+                state.governor.congestion("timeout")
+            shot = await safe_screenshot(form, f"exception_submit_baris_{i+1}", self.screenshot_dir)
+            log("ERROR", "SUBMIT", f"EXCEPTION:{e}", shot)
+            return "ERROR", normspace(e)[:200]
 
-    # Rentang baris (1-indexed → 0-based)
-    start_idx, end_idx = slice_rows(df, args.start, args.end)
+        if result != "OK":
+            shot = await safe_screenshot(form, f"submit_issue_baris_{i+1}_{result}", self.screenshot_dir)
+            log("ERROR", "SUBMIT", result, shot)
+            if result == "ERROR_FILL":
+                print("    ERROR_FILL terdeteksi: tab form dibiarkan terbuka untuk diperiksa.")
+            return result, ""
 
-    logs = []
+        log("OK", "SUBMIT", "Submit final sukses")
+        return "OK", ""
 
-    async with async_playwright() as p:
-        browser = await p.chromium.connect_over_cdp(CDP_ENDPOINT)
-        context = browser.contexts[0]
-        page = await get_active_directory_page(context)
 
-        for i in range(start_idx, end_idx):
-            row = df.iloc[i]
-            nama_val = normspace (row.get("Nama"))
-            status_web = normspace(row.get("Status"))
-            phone_val = normspace(row.get("Nomor Telepon"))
-            email_val = normspace(row.get("Email"))
-            lat_val = normspace(row.get("Latitude"))
-            lon_val = normspace(row.get("Longitude"))
-            sumber_val = normspace(row.get("Sumber"))
-            catatan_val = normspace(row.get("Catatan"))
+# ---------- Engine HTTP (--engine http) ----------
 
-            print(f"\n=== Baris {i + 1} :: {nama_val} :: Status = {status_web} ===")
+async def process_row_http(state: RunState, engine: HttpSubmitter, row: ExcelRow) -> tuple[str, str]:
+    """
+    Satu percobaan lewat HTTP: GET form → (cek kunci / tidak berubah) → POST Submit Final.
+    Hasil (kode, detail) dengan kosakata yang sama dengan submit_and_handle, ditambah
+    "FALLBACK" = baris perlu diproses ulang lewat browser dan "NO_SUBMIT_RESPONSE" = POST mungkin
+    sudah diterima server tanpa respons (tidak dicoba ulang agar Submit Final tidak terkirim dua kali).
+    """
+    args = state.args
+    i, idsbr = row.index, row.idsbr
 
-            # --- Klik Edit ---
-            try:
-                clicked = False
-                if args.match_by == "index":
-                    clicked = await click_edit_by_index(page, i - start_idx)
-                elif args.match_by == "idsbr":
-                    clicked = await click_edit_by_text(page, normspace(row.get("IDSBR")))
-                elif args.match_by == "name":
-                    clicked = await click_edit_by_text(page, normspace(row.get("Nama")))
-
-                if not clicked:
-                    shot = await safe_screenshot(page, f"gagal_klik_edit_baris_{i+1}")
-                    print("  ! [ERROR] CLICK_EDIT: Tombol Edit tidak ditemukan / tidak bisa diklik")
-                    logs.append({"row_index": i+1, "result": "ERROR", "note": "CLICK_EDIT", "screenshot": shot})
-                    break  
-            except Exception as e:
-                shot = await safe_screenshot(page, f"exception_click_edit_baris_{i+1}")
-                print(f"  ! [ERROR] CLICK_EDIT_EXCEPTION: {e}")
-                logs.append({"row_index": i+1, "result": "ERROR", "note": f"CLICK_EDIT_EXCEPTION: {e}", "screenshot": shot})
-                break  
-
-            # --- Popup 'Ya, edit!' ---
-            try:
-                ya_edit = page.get_by_role("button", name=re.compile(r"Ya,\s*edit!?$", re.I))
-                await ensure_click(ya_edit, "Ya, edit!")
-            except PWError:
-                pass
+    def log(level: str, stage: str, note: str):
+        log_event(state.log, i+1, level, stage, note, idsbr=idsbr)
 
-            await page.wait_for_timeout(PAUSE_AFTER_EDIT_CLICK_MS)
+    print(f"\n=== Baris {i + 1} :: {row.nama} :: Status = {row.status} (http) ===")
+    if not idsbr:
+        log("ERROR", "HTTP_FORM", "IDSBR kosong, URL form tidak bisa dibentuk")
+        return "ERROR", "IDSBR kosong"
 
-            # --- Ambil tab baru ---
-            try:
-                new_page = await context.wait_for_event("page", timeout=MAX_WAIT_MS)
-            except PWError as e:
-                shot = await safe_screenshot(page, f"no_new_tab_baris_{i+1}")
-                log_event(logs, i+1, "ERROR", "OPEN_TAB", f"Tidak ada tab form: {e}", shot)
-                if args.stop_on_error:
-                    break
+    try:
+        with PROFILER.span("HTTP_FORM"):
+            snap = await engine.fetch_form(idsbr)
+    except SessionExpired as e:
+        log("ERROR", "HTTP_FORM", f"Sesi habis: {e}")
+        return "SESSION", str(e)
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.TimeoutException):
+            state.governor.congestion("timeout")
+        log("ERROR", "HTTP_FORM", f"Gagal mengambil form: {e!r}")
+        return "NO_RESPONSE", repr(e)[:200]
+
+    if snap.is_locked():
+        log("WARN", "EDIT_LOCKED", "Form sedang dikunci/diedit oleh user lain. Melewati baris ini.")
+        return "LOCKED", ""
+    if args.skip_unchanged and form_diff(row, snap.current()) == []:
+        log("OK", "SKIPPED_UNCHANGED", "Nilai form sudah sama dengan Excel, tidak di-submit")
+        state.journal.record(idsbr, row.hash, i+1, outcome="unchanged")
+        return "SKIPPED", ""
 
-            await new_page.bring_to_front()
+    try:
+        t_submit = time.perf_counter()
+        with PROFILER.span("HTTP_SUBMIT"):
+            result, detail = await engine.submit(idsbr, snap, row)
+    except HttpRowError as e:
+        log("WARN", "HTTP_SUBMIT", f"{e}; dialihkan ke browser")
+        return "FALLBACK", str(e)
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.TimeoutException):
+            state.governor.congestion("timeout")
+        log("ERROR", "SUBMIT", f"EXCEPTION:{e!r}")
+        return transport_error_code(e), repr(e)[:200]
+
+    if result == "OK":
+        state.governor.success(time.perf_counter() - t_submit)
+        log("OK", "SUBMIT", "Submit final sukses (http)")
+        return "OK", detail
+    if result == "KONSISTENSI":
+        # peringatan konsistensi perlu tombol Ignore di form → serahkan ke browser
+        log("WARN", "SUBMIT", "Cek Konsistensi; dialihkan ke browser")
+        return "FALLBACK", detail
+    if result == "SESSION":
+        log("ERROR", "SUBMIT", f"Sesi habis/CSRF ditolak: {detail}")
+        return result, detail
+    if result == "NO_SUCCESS_SIGNAL" or result.startswith("HTTP_5"):
+        state.governor.congestion(result.lower())
+    log("ERROR", "SUBMIT", f"{result}: {detail}")
+    return result, detail
+
+
+async def capture_submit_shape(state: RunState, engine: HttpSubmitter, row: ExcelRow,
+                               start_idx: int) -> tuple[SubmitShape, str]:
+    """
+    Proses satu baris lewat browser sambil merekam request Submit Final-nya. Payload asli
+    dibandingkan dengan payload yang dibangun dari HTML form baris itu (diambil sebelum submit).
+    """
+    before = await engine.fetch_form(row.idsbr)
+    captured = []
 
-            # Jika ternyata form sedang diedit profiler lain
-            try:
-                if await is_edit_locked_page(new_page):
-                    shot = await safe_screenshot(new_page, f"edit_locked_baris_{i+1}")
-                    log_event(logs, i+1, "WARN", "EDIT_LOCKED",
-                            "Form sedang dikunci/diedit oleh user lain. Melewati baris ini.", shot)
-                    try:
-                        await new_page.close()
-                    except Exception:
-                        pass
-
-                    await page.bring_to_front()
-                    await page.wait_for_timeout(300)
-                    continue
-            except Exception:
-                pass
+    def on_request(req):
+        if is_submit_request(req):
+            captured.append(req)
 
-            # --- Isi form ---
-            try:
-                await fill_form(
-                    new_page,
-                    status_web,
-                    phone_val,
-                    email_val,
-                    lat_val,
-                    lon_val,
-                    sumber_val,
-                    catatan_val)
-                log_event(logs, i+1, "OK", "FILL", "Form terisi")
-            except Exception as e:
-                shot = await safe_screenshot(new_page, f"exception_fill_form_baris_{i+1}")
-                log_event(logs, i+1, "ERROR", "FILL", f"Exception isi form: {e}", shot)
+    state.context.on("request", on_request)
+    try:
+        result = (await process_rows(state, [row], start_idx)).get(row.index, "MISSING")
+    finally:
+        state.context.remove_listener("request", on_request)
+    if result != "OK" or not captured:
+        raise RuntimeError(f"Gagal merekam request Submit Final dari baris {row.index + 1} ({result}). "
+                           f"Periksa baris itu atau pakai --engine browser.")
+
+    req = captured[-1]
+    shape = SubmitShape.from_request(req.method, req.url, await req.all_headers(), req.post_data or "", row.idsbr)
+    verify_shape(shape, req.post_data or "", before, row)
+    return shape, result
+
+
+async def run_http_shard(state: RunState, rows: list[ExcelRow], start_idx: int) -> dict[int, str]:
+    """Kirim baris lewat HTTP (maks --http-concurrency bersamaan); baris FALLBACK diulang lewat browser."""
+    args = state.args
+    results = {}
+    if not rows:
+        return results
+    template = state.edit_url_template or args.edit_url_template or await read_edit_url_template(state.page)
+    shape_path = Path(args.submit_shape)
+    shape = SubmitShape.load(shape_path) if shape_path.exists() else None
+    state.action.shape = shape
+    engine = HttpSubmitter(shape, template, await state.context.cookies(),
+                           await state.page.evaluate("navigator.userAgent"), args.http_concurrency)
+    try:
+        if shape is None:
+            first, rows = rows[0], rows[1:]
+            print(f"[INFO] Merekam bentuk request Submit Final dari baris {first.index + 1} (lewat browser)...")
+            engine.shape, results[first.index] = await capture_submit_shape(state, engine, first, start_idx)
+            engine.shape.save(shape_path)
+            state.action.shape = engine.shape
+            print(f"[INFO] Bentuk request tersimpan di {shape_path}: {engine.shape.method} {engine.shape.url}")
+
+        # antrean terbatas seperti run_pool: baris yang belum mulai tidak dijalankan setelah run dihentikan
+        queue: asyncio.Queue = asyncio.Queue()
+        for r in rows:
+            queue.put_nowait(r)
+
+        async def worker():
+            while not state.stop.is_set():
                 try:
-                    await new_page.close()
-                except:
-                    pass
-                if args.stop_on_error:
-                    break
+                    row = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await run_attempts(state, row, lambda: process_row_http(state, engine, row))
+                if result is not None:
+                    results[row.index] = result
+
+        await asyncio.gather(*(worker() for _ in range(args.http_concurrency)))
+    finally:
+        await engine.aclose()
+
+    fallback = [r for r in rows if results.get(r.index) == "FALLBACK"]
+    if fallback and not state.stop.is_set():
+        print(f"[INFO] {len(fallback)} baris diproses ulang lewat browser")
+        results.update(await process_rows(state, fallback, start_idx))
+    return results
+
+
+# ---------- Plan (--plan / --from-plan) ----------
+
+PLAN_FIELDS = ("row_index", "idsbr", "nama", "key", "action", "reason", "hash")
+
+
+async def find_missing_rows(args, directory: DirectoryIndex, todo: list[ExcelRow], start_idx: int) -> set[int]:
+    """Index baris Excel yang tidak ada di tabel direktori, dengan aturan pencocokan yang sama dengan run."""
+    pending = {}
+    for r in todo:
+        pending.setdefault(pending_key(args.match_by, r, start_idx), []).append(r)
+    if args.all_pages:
+        # stream baris satu per satu; berhenti begitu semua baris Excel sudah ketemu
+        cursor = DirectoryCursor(directory)
+        async for _, drow in cursor.rows():
+            pending.pop(str(cursor.position) if args.match_by == "index" else match_pending(drow, pending), None)
+            if not pending:
+                break
+    else:
+        await directory.refresh()
+        for key in list(pending):
+            if args.match_by == "index":
+                found = directory.at(int(key))
+            else:
+                found = directory.find(key)
+            if found is not None:
+                del pending[key]
+    return {r.index for rows in pending.values() for r in rows}
 
-            # --- Submit & handle ---
-            try:
-                result = await submit_and_handle(new_page)
-
-                if result != "OK":
-                    shot = await safe_screenshot(new_page, f"submit_issue_baris_{i+1}_{result}")
-
-                    level = "ERROR" if result != "ERROR_FILL" else "ERROR"
-                    log_event(logs, i+1, level, "SUBMIT", result, shot)
-
-                    if result == "ERROR_FILL":
-                        print("    ERROR_FILL terdeteksi: tab form dibiarkan terbuka untuk diperiksa.")
-                        await new_page.bring_to_front()
-
-                        if args.stop_on_error:
-                            print("    --stop-on-error aktif: menghentikan proses.")
-                            break
-                        else:
-                            await page.bring_to_front()
-                            await page.wait_for_timeout(300)
-                            continue
-                    else:
-                        try:
-                            await new_page.close()
-                        except:
-                            pass
-                        if args.stop_on_error:
-                            break
-                        else:
-                            continue
-                else:
-                    log_event(logs, i+1, "OK", "SUBMIT", "Submit final sukses")
 
-            except Exception as e:
-                shot = await safe_screenshot(new_page, f"exception_submit_baris_{i+1}")
-                log_event(logs, i+1, "ERROR", "SUBMIT", f"EXCEPTION:{e}", shot)
-                try:
-                    await new_page.close()
-                except:
-                    pass
-                if args.stop_on_error:
-                    break
-                else:
-                    continue
+async def write_plan(args, rows: list[ExcelRow], skipped: dict[int, tuple[str, str]], start_idx: int) -> None:
+    """
+    Prediksi aksi tiap baris tanpa membuka form: fill, skip (validasi/jurnal), missing (tidak ada
+    di tabel direktori) atau locked (run sebelumnya berakhir terkunci). Hasil ke file plan + estimasi waktu.
+    """
+    todo = [r for r in rows if r.index not in skipped]
+    history = read_log_history(LOG_CSV)
+    last = last_stage_by_row(history)
+
+    missing = set()
+    if args.open_by == "url":
+        print("[INFO] --open-by url: keberadaan baris di tabel direktori tidak dicek")
+    else:
+        async with async_playwright() as p:
+            _, page, _ = await open_directory_page(p, (args.headless or args.cdp)[0], args)
+            missing = await find_missing_rows(args, DirectoryIndex(page, timeout_ms=MAX_WAIT_MS), todo, start_idx)
+
+    entries = []
+    for r in rows:
+        if r.index in skipped:
+            action, reason = skipped[r.index]
+        elif r.index in missing:
+            action, reason = "missing", "tidak ada di tabel direktori"
+        elif (stage := last.get(r.idsbr) if r.idsbr else last.get(f"#{r.index + 1}")) in LOCKED_STAGES:
+            action, reason = "locked", f"run sebelumnya: {stage}"
+        else:
+            action, reason = "fill", ""
+        entries.append({"row_index": r.index + 1, "idsbr": r.idsbr, "nama": r.nama,
+                        "key": pending_key(args.match_by, r, start_idx), "action": action,
+                        "reason": reason, "hash": r.hash})
+
+    with open(args.plan, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=PLAN_FIELDS)
+        writer.writeheader()
+        writer.writerows(entries)
+
+    counts = {a: sum(e["action"] == a for e in entries) for a in ("fill", "locked", "skip", "missing")}
+    per_row = seconds_per_row(history)
+    source = f"log {LOG_CSV}" if per_row else "nilai default"
+    per_row = per_row or DEFAULT_ROW_SECONDS
+    total = (counts["fill"] + counts["locked"]) * per_row
+    print(f"[INFO] Plan tersimpan di {args.plan}: " + " ".join(f"{a}={n}" for a, n in counts.items()))
+    print(f"[INFO] Estimasi waktu: {counts['fill'] + counts['locked']} baris x {per_row:.1f} dtk "
+          f"≈ {int(total // 3600)} jam {int(total % 3600 // 60)} menit ({source})")
+
+
+def read_plan(path) -> dict[int, dict]:
+    """Isi file plan, dikunci dengan row_index (1-based)."""
+    with open(path, newline="", encoding="utf-8") as fh:
+        return {int(e["row_index"]): e for e in csv.DictReader(fh)}
 
-            # Tutup tab dan kembali ke direktori
-            try:
-                await new_page.close()
-            except PWError:
-                pass
-            await page.bring_to_front()
-            await page.wait_for_timeout(800)
-            log_event(logs, i+1, "OK", "ROW_DONE", "Baris selesai diproses")
-            ok_count += 1
 
-    # Simpan log
-    pd.DataFrame(logs).to_csv(LOG_CSV, index=False)
-    print(f"\nSelesai. Log tersimpan di: {LOG_CSV}")
+def apply_plan(todo: list[ExcelRow], plan: dict[int, dict]) -> list[ExcelRow]:
+    """
+    Buang baris yang di plan berstatus skip/missing (selama isi barisnya belum berubah sejak plan dibuat);
+    baris yang diprediksi locked dikerjakan paling akhir agar kuncinya sempat terlepas.
+    """
+    def action(r: ExcelRow) -> str:
+        e = plan.get(r.index + 1)
+        return e["action"] if e and e.get("hash") == r.hash else "fill"
+
+    kept = [r for r in todo if action(r) not in ("skip", "missing")]
+    return sorted(kept, key=lambda r: action(r) == "locked")
+
+
+async def run(args):
+    if args.export_state:
+        await export_state(args)
+        return
+
+    # Pilih file Excel otomatis dari folder script (atau sesuai --excel) + validasi kolom wajib
+    action = FillAction()
+    df, start_idx, end_idx = load_rows(action, args, Path(__file__).resolve().parent)
+    if args.engine == "http" and "IDSBR" not in df.columns:
+        raise RuntimeError("Engine 'http' dipilih tapi kolom 'IDSBR' tidak ada di Excel")
+
+    # Jurnal checkpoint: selalu ditulis; dengan --resume baris yang sudah ROW_DONE dilewati
+    journal = Journal(Path(args.journal))
+    todo = list(iter_rows(df, start_idx, end_idx))
+
+    skipped = {}    # index baris -> (aksi, alasan), dipakai juga oleh --plan
+
+    # Validasi sebelum browser dipakai: baris yang pasti gagal tidak perlu dibuka
+    if not args.no_validate:
+        rejects = rejected_rows(df, start_idx, end_idx)
+        if len(rejects):
+            rejects.to_csv(REJECTS_CSV, index=False)
+            for rec in rejects.itertuples(index=False):
+                skipped[rec.row_index - 1] = ("skip", f"validasi: {rec.reason}")
+            print(f"[WARN] {len(rejects)} baris ditolak validasi (lihat {REJECTS_CSV}), tidak diproses")
+
+    if args.resume:
+        done = [r for r in todo if r.index not in skipped and journal.is_done(r.idsbr, r.hash)]
+        for r in done:
+            skipped[r.index] = ("skip", "sudah selesai di jurnal")
+        print(f"[INFO] --resume: {len(done)} baris sudah selesai di {args.journal}, dilewati")
+
+    if args.plan:
+        journal.close()
+        await write_plan(args, todo, skipped, start_idx)
+        return
+
+    todo = [r for r in todo if r.index not in skipped]
+    if args.from_plan:
+        before = len(todo)
+        todo = apply_plan(todo, read_plan(args.from_plan))
+        print(f"[INFO] --from-plan: {before - len(todo)} baris skip/missing menurut {args.from_plan}, dilewati")
+
+    results, sink = await run_pipeline(action, args, todo, start_idx, journal)
+
+    c = sink.counts
+    results = list(results.values())
+    if results.count("LOCKED"):
+        print(f"[WARN] {results.count('LOCKED')} baris tetap terkunci (lihat stage LOCK_GAVE_UP di log)")
+    if results.count("SKIPPED"):
+        print(f"[INFO] {results.count('SKIPPED')} baris tidak berubah, tidak di-submit (SKIPPED_UNCHANGED)")
+    print(f"\nSelesai. {results.count('OK') + results.count('SKIPPED')}/{len(results)} baris sukses "
+          f"(OK={c['OK']} WARN={c['WARN']} ERROR={c['ERROR']} event). Log tersimpan di: {LOG_CSV}")
 
 
 def parse_args():
     ap = argparse.ArgumentParser(description="SBR Autofill (Chrome attach via CDP)")
-    ap.add_argument("--excel", default=None, help="Path ke file Excel (opsional; bila kosong akan dicari otomatis)")
-    ap.add_argument("--sheet", type=int, default=SHEET_NAME, help="Index sheet Excel (default 0)")
-    ap.add_argument("--start", type=int, default=None, help="Mulai dari baris ke- (1-indexed)")
-    ap.add_argument("--end", type=int, default=None, help="Sampai baris ke- (inklusif; default = semua)")
-    ap.add_argument("--match-by", choices=["index", "idsbr", "name"], default="index",
-                    help="Cara memilih tombol Edit: index (default), idsbr, atau name")
-    ap.add_argument("--stop-on-error", action="store_true",
-                    help="Berhenti di error pertama (default lanjut ke baris berikutnya).")
-    return ap.parse_args()
+    add_common_args(ap)
+    ap.add_argument("--engine", choices=["browser", "http"], default="browser",
+                    help="browser (isi & submit lewat form, default) atau http (POST langsung memakai cookie browser)")
+    ap.add_argument("--submit-shape", default=SHAPE_PATH, metavar="FILE",
+                    help=f"Bentuk request Submit Final untuk --engine http; direkam dari baris pertama bila belum ada. "
+                         f"Bila ada, juga dipakai --engine browser untuk mengenali respons submit (default {SHAPE_PATH})")
+    ap.add_argument("--http-concurrency", type=int, default=8,
+                    help="Maks request HTTP bersamaan untuk --engine http (default 8)")
+    ap.add_argument("--fill-mode", choices=["fast", "locator"], default="fast",
+                    help="Cara mengisi form: fast (satu evaluate, fallback locator per field; default) atau locator")
+    ap.add_argument("--skip-unchanged", action="store_true",
+                    help="Baca nilai form dulu; bila sama dengan Excel, tab ditutup tanpa Submit Final")
+    ap.add_argument("--journal", default=JOURNAL_PATH,
+                    help=f"File jurnal checkpoint baris yang sudah selesai (default {JOURNAL_PATH})")
+    ap.add_argument("--no-validate", action="store_true",
+                    help="Tetap proses baris yang gagal validasi Excel (Status/koordinat/email)")
+    ap.add_argument("--plan", nargs="?", const=PLAN_CSV, default=None, metavar="FILE",
+                    help=f"Dry-run: cocokkan semua baris dengan tabel direktori, tulis plan aksi + estimasi waktu "
+                         f"tanpa membuka form (default {PLAN_CSV})")
+    ap.add_argument("--from-plan", default=None, metavar="FILE",
+                    help="Jalankan sesuai file plan: baris skip/missing dilewati, baris locked dikerjakan terakhir")
+    ap.add_argument("--resume", action="store_true",
+                    help="Lewati baris yang sudah tercatat selesai di jurnal (IDSBR + isi baris sama)")
+    args = ap.parse_args()
+    check_common_args(ap, args)
+    if args.http_concurrency < 1:
+        ap.error("--http-concurrency minimal 1")
+    if args.plan and args.from_plan:
+        ap.error("--plan dan --from-plan tidak bisa dipakai bersamaan")
+    return args
 
 if __name__ == "__main__":
     import sys, traceback
     try:
         args = parse_args()
-        print(f"[INFO] start sbrfill.py  | match_by={args.match_by} | start={args.start} | end={args.end}")
+        print(f"[INFO] start sbrfill.py  | match_by={args.match_by} | start={args.start} | end={args.end} | workers={args.workers} | open_by={args.open_by} | cdp={','.join(args.cdp)}")
         asyncio.run(run(args))
     except SystemExit:
         raise
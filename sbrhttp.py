@@ -0,0 +1,410 @@
+import asyncio
+import json
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+from sbrcore import LOCK_TEXT_RE, STATUS_ID_MAP, ExcelRow, norm_phone_str, normfloat_str, normspace
+
+try:
+    import httpx
+except ImportError:     # opsional: hanya dibutuhkan sbrfill.py --engine http
+    httpx = None
+
+# ====== ENGINE SUBMIT HTTP (sbrfill.py --engine http) ======
+# Bentuk request Submit Final direkam sekali dari sesi Playwright (SubmitShape), lalu tiap baris:
+# GET halaman form (nilai field + token CSRF terbaru) → timpa field dari Excel → POST dengan cookie browser.
+
+SHAPE_PATH = "submit_shape_sbr.json"
+HTTP_TIMEOUT_S = 20.0
+# header yang ikut dikirim ulang; token CSRF selalu diambil segar per baris
+REPLAY_HEADERS = ("accept", "content-type", "x-requested-with", "origin", "referer")
+ERROR_FILL_RE = re.compile(r"Masih\s+terdapat\s+isian\s+yang\s+harus\s+diperbaiki|harus\s+diperbaiki", re.I)
+KONSISTENSI_RE = re.compile(r"Cek\s+Konsistensi", re.I)
+LOGIN_URL_RE = re.compile(r"/login|/sso|/auth", re.I)
+TOKEN_KEYS = ("_token", "csrf_token", "_csrf")
+
+
+class HttpRowError(RuntimeError):
+    """Baris tidak bisa dikirim lewat HTTP (field form tidak dikenali) → diproses ulang lewat browser."""
+
+
+class SessionExpired(RuntimeError):
+    """Cookie sesi ditolak server (redirect login / 401 / 403 / 419)."""
+
+
+# ---------- Parsing HTML form ----------
+
+@dataclass(slots=True)
+class FormField:
+    tag: str
+    type: str
+    name: str
+    id: str
+    value: str
+    placeholder: str
+    checked: bool = False
+    disabled: bool = False
+
+
+class _FormParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields: list[FormField] = []
+        self.csrf = ""
+        self._textarea: FormField | None = None
+        self._select: FormField | None = None
+        self._select_first: str | None = None
+
+    def handle_starttag(self, tag, attrs):
+        a = {k: (v or "") for k, v in attrs}
+        if tag == "meta" and a.get("name", "").lower() in ("csrf-token", "_csrf"):
+            self.csrf = a.get("content", "")
+        elif tag in ("input", "textarea", "select"):
+            f = FormField(tag=tag, type=a.get("type", "text" if tag == "input" else tag).lower(),
+                          name=a.get("name", ""), id=a.get("id", ""), value=a.get("value", ""),
+                          placeholder=a.get("placeholder", ""), checked="checked" in a, disabled="disabled" in a)
+            self.fields.append(f)
+            if tag == "textarea":
+                self._textarea = f
+            elif tag == "select":
+                self._select, self._select_first = f, None
+        elif tag == "option" and self._select is not None:
+            value = a.get("value", "")
+            if self._select_first is None:
+                self._select_first = value
+                self._select.value = value
+            if "selected" in a:
+                self._select.value = value
+
+    def handle_data(self, data):
+        if self._textarea is not None:
+            self._textarea.value += data
+
+    def handle_endtag(self, tag):
+        if tag == "textarea":
+            self._textarea = None
+        elif tag == "select":
+            self._select = None
+
+
+@dataclass
+class FormSnapshot:
+    """Isi form edit hasil GET (tanpa menjalankan JavaScript)."""
+    fields: list[FormField]
+    csrf: str = ""
+    html: str = ""
+
+    @classmethod
+    def parse(cls, html: str) -> "FormSnapshot":
+        p = _FormParser()
+        p.feed(html)
+        p.close()
+        return cls(fields=p.fields, csrf=p.csrf, html=html)
+
+    @property
+    def names(self) -> set[str]:
+        return {f.name for f in self.fields if f.name}
+
+    def pairs(self) -> list[tuple[str, str]]:
+        """Serialisasi seperti browser: radio/checkbox hanya bila dicentang, field disabled tidak ikut."""
+        out = []
+        for f in self.fields:
+            if not f.name or f.disabled or f.type in ("submit", "button", "reset", "file", "image"):
+                continue
+            if f.type in ("radio", "checkbox") and not f.checked:
+                continue
+            out.append((f.name, f.value if f.type not in ("radio", "checkbox") else (f.value or "on")))
+        return out
+
+    def by_id(self, element_id: str) -> FormField | None:
+        if not element_id:
+            return None
+        return next((f for f in self.fields if f.id == element_id), None)
+
+    def find(self, ids=(), names=(), types=(), placeholder: re.Pattern | None = None) -> FormField | None:
+        for f in self.fields:
+            if f.tag == "input" and f.type in ("radio", "checkbox", "hidden"):
+                continue
+            if (f.id in ids or f.name in names or f.type in types
+                    or (placeholder is not None and placeholder.search(f.placeholder))):
+                return f
+        return None
+
+    # field yang diisi dari Excel; aturan sama dengan selector di FAST_FILL_JS / READ_FORM_JS
+    def phone(self):
+        return self.find(ids=("nomor_telepon",), names=("nomor_telepon", "no_telp", "telepon"),
+                         placeholder=re.compile(r"^Nomor\s*Telepon$", re.I))
+
+    def email(self):
+        return self.find(ids=("email",), names=("email",), types=("email",))
+
+    def lat(self):
+        return self.find(ids=("latitude",), names=("latitude",), placeholder=re.compile(r"^latitude", re.I))
+
+    def lon(self):
+        return self.find(ids=("longitude",), names=("longitude",), placeholder=re.compile(r"^longitude", re.I))
+
+    def sumber(self):
+        return self.find(placeholder=re.compile(r"Sumber\s+Profiling", re.I))
+
+    def catatan(self):
+        return self.find(ids=("catatan_profiling",))
+
+    def current(self) -> dict:
+        """Nilai form dalam bentuk yang sama dengan READ_FORM_JS (untuk form_diff / --skip-unchanged)."""
+        radio = next((f for f in self.fields if f.type == "radio" and f.id.startswith("kondisi_") and f.checked), None)
+        cb = self.by_id("check-email")
+
+        def val(f):
+            return normspace(f.value) if f else None
+
+        return {
+            "status_id": radio.id if radio else "",
+            "phone": val(self.phone()),
+            "email": "" if cb is not None and not cb.checked else val(self.email()),
+            "lat": val(self.lat()), "lon": val(self.lon()),
+            "sumber": val(self.sumber()), "catatan": val(self.catatan()),
+        }
+
+    def is_locked(self) -> bool:
+        return not any(f.id.startswith("kondisi_") or f.id == "catatan_profiling" for f in self.fields) \
+            and bool(re.search(LOCK_TEXT_RE, self.html, re.I))
+
+
+def excel_overrides(snap: FormSnapshot, row: ExcelRow) -> tuple[dict[str, str], set[str]]:
+    """
+    Nilai field dari Excel (name -> value) dan nama field yang harus dihapus dari payload.
+    Aturannya sama dengan fill_form: nilai Excel kosong tidak menyentuh field; toggle email
+    hanya dimatikan bila Excel dan web sama-sama kosong.
+    """
+    set_, drop = {}, set()
+
+    def put(label: str, f: FormField | None, value: str):
+        if not value:
+            return
+        if f is None or not f.name:
+            raise HttpRowError(f"field {label} tidak ditemukan di HTML form")
+        set_[f.name] = value
+
+    status = normspace(row.status)
+    if status:
+        radio_id = STATUS_ID_MAP.get(status)
+        if not radio_id:
+            raise HttpRowError(f"status '{status}' tidak dikenal")
+        radio = snap.by_id(radio_id)
+        if radio is None or not radio.name:
+            raise HttpRowError(f"radio status '{status}' tidak ditemukan di HTML form")
+        set_[radio.name] = radio.value
+
+    put("nomor telepon", snap.phone(), norm_phone_str(row.phone))
+    put("latitude", snap.lat(), normfloat_str(row.lat))
+    put("longitude", snap.lon(), normfloat_str(row.lon))
+    put("sumber profiling", snap.sumber(), row.sumber)
+    put("catatan profiling", snap.catatan(), row.catatan)
+
+    email, cb = snap.email(), snap.by_id("check-email")
+    excel_email = (row.email or "").strip()
+    if excel_email:
+        put("email", email, excel_email)
+        if cb is not None and cb.name:
+            set_[cb.name] = cb.value or "on"
+    elif not (email and email.value.strip()) and cb is not None and cb.name:
+        drop.add(cb.name)
+        if email and email.name:
+            set_[email.name] = ""
+    return set_, drop
+
+
+# ---------- Bentuk request Submit Final ----------
+
+@dataclass
+class SubmitShape:
+    method: str
+    url: str                    # boleh memuat {idsbr}
+    encoding: str               # "form" (x-www-form-urlencoded) | "json"
+    headers: dict[str, str] = field(default_factory=dict)
+    keys: list[str] = field(default_factory=list)
+    csrf_header: str = ""       # nama header token CSRF bila request aslinya memakainya
+
+    @classmethod
+    def from_request(cls, method: str, url: str, headers: dict, post_data: str, idsbr: str) -> "SubmitShape":
+        headers = {k.lower(): v for k, v in headers.items()}
+        ctype = headers.get("content-type", "")
+        if "json" in ctype:
+            data = json.loads(post_data or "{}")
+            if not isinstance(data, dict) or any(isinstance(v, (dict, list)) for v in data.values()):
+                raise RuntimeError("Payload submit JSON bertingkat; engine http hanya mendukung payload datar")
+            keys, encoding = list(data), "json"
+        elif "multipart" in ctype:
+            raise RuntimeError("Payload submit multipart/form-data belum didukung engine http")
+        else:
+            keys, encoding = list(dict.fromkeys(k for k, _ in parse_qsl(post_data or "", keep_blank_values=True))), "form"
+        if idsbr:
+            # hanya di path/query dan sebagai token utuh (bukan potongan host/port)
+            parts = urlsplit(url)
+            tail = re.sub(rf"(?<![0-9A-Za-z]){re.escape(idsbr)}(?![0-9A-Za-z])", "{idsbr}",
+                          urlunsplit(("", "", parts.path, parts.query, parts.fragment)))
+            url = f"{parts.scheme}://{parts.netloc}{tail}"
+        csrf_header = next((h for h in ("x-csrf-token", "x-xsrf-token") if h in headers), "")
+        return cls(method=method.upper(), url=url, encoding=encoding,
+                   headers={k: v for k, v in headers.items() if k in REPLAY_HEADERS},
+                   keys=keys, csrf_header=csrf_header)
+
+    @classmethod
+    def load(cls, path) -> "SubmitShape":
+        return cls(**json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def save(self, path) -> None:
+        Path(path).write_text(json.dumps(self.__dict__, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def url_for(self, idsbr: str) -> str:
+        return self.url.replace("{idsbr}", quote(idsbr, safe=""))
+
+    def matches(self, method: str, url: str) -> bool:
+        """Request ini = endpoint Submit Final yang direkam (method + path, {idsbr} boleh IDSBR mana pun)."""
+        if method.upper() != self.method:
+            return False
+        pattern = r"[^/]+".join(re.escape(part) for part in urlsplit(self.url).path.split("{idsbr}"))
+        return re.fullmatch(pattern, urlsplit(url).path) is not None
+
+    def payload(self, snap: FormSnapshot, row: ExcelRow) -> list[tuple[str, str]]:
+        """Payload baris ini: nilai form saat ini + timpaan Excel, dibatasi ke field yang dikirim form asli."""
+        unknown = [k for k in self.keys if k not in snap.names and k not in TOKEN_KEYS]
+        if unknown:
+            raise HttpRowError(f"field submit tidak ada di HTML form: {', '.join(unknown[:5])}")
+        overrides, drop = excel_overrides(snap, row)
+        wanted = set(self.keys) | set(overrides)
+        out, seen = [], set()
+        for name, value in snap.pairs():
+            if name not in wanted or name in drop:
+                continue
+            if name in overrides:
+                if name in seen:
+                    continue
+                value = overrides[name]
+            out.append((name, value))
+            seen.add(name)
+        out += [(k, v) for k, v in overrides.items() if k not in seen and k not in drop]
+        return out
+
+
+def is_submit_failure(code: str) -> bool:
+    """Kode classify_response yang pasti gagal (bukan sekadar belum ada tanda sukses)."""
+    return code in ("ERROR_FILL", "SESSION") or code.startswith("HTTP_")
+
+
+def verify_shape(shape: SubmitShape, captured_post: str, snap: FormSnapshot, row: ExcelRow) -> None:
+    """
+    Pastikan payload hasil rekonstruksi dari HTML form = payload asli browser untuk baris yang sama.
+    Bila form diisi lewat JavaScript (nilai tidak ada di HTML), engine http bisa mengosongkan data → tolak.
+    """
+    if shape.encoding == "json":
+        original = {k: "" if v is None else str(v) for k, v in json.loads(captured_post or "{}").items()}
+    else:
+        original = dict(parse_qsl(captured_post or "", keep_blank_values=True))
+    rebuilt = dict(shape.payload(snap, row))
+    diff = [k for k, v in original.items()
+            if k not in TOKEN_KEYS and normspace(v) != normspace(rebuilt.get(k, ""))]
+    if diff:
+        raise RuntimeError("Payload dari HTML form berbeda dengan payload asli browser pada field: "
+                           f"{', '.join(diff[:8])}. Engine http tidak aman untuk form ini; pakai --engine browser.")
+
+
+def classify_response(status: int, text: str) -> str:
+    """Hasil submit HTTP dengan kosakata yang sama dengan submit_and_handle (+ KONSISTENSI / SESSION / HTTP_xxx)."""
+    if status in (401, 403, 419):
+        return "SESSION"
+    if status == 422 or ERROR_FILL_RE.search(text):     # 422 = galat validasi isian
+        return "ERROR_FILL"
+    if KONSISTENSI_RE.search(text):
+        return "KONSISTENSI"
+    if not 200 <= status < 300:
+        return f"HTTP_{status}"
+    try:
+        data = json.loads(text)
+    except ValueError:
+        # HTML (mis. redirect kembali ke halaman form) bukan bukti tersimpan
+        return "OK" if not text.strip() else "NO_SUCCESS_SIGNAL"
+    if isinstance(data, dict):
+        flag = data.get("success", data.get("status"))
+        if flag is True or flag == 1 or str(flag).lower() in ("success", "ok", "true", "200"):
+            return "OK"
+    return "NO_SUCCESS_SIGNAL"
+
+
+def transport_error_code(e: Exception) -> str:
+    """
+    Galat httpx saat Submit Final: NO_RESPONSE (request belum terkirim, aman dicoba ulang) atau
+    NO_SUBMIT_RESPONSE (request mungkin sudah sampai server, mis. read timeout → jangan dikirim ulang).
+    """
+    if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return "NO_RESPONSE"
+    return "NO_SUBMIT_RESPONSE"
+
+
+def response_detail(text: str, limit: int = 200) -> str:
+    """Ringkasan respons untuk log: message + galat validasi dari JSON, atau potongan teks."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return normspace(re.sub(r"<[^>]+>", " ", text))[:limit]
+    if not isinstance(data, dict):
+        return normspace(str(data))[:limit]
+    parts = [str(data.get("message") or data.get("msg") or "")]
+    errors = data.get("errors")
+    if isinstance(errors, dict):
+        parts += [f"{k}: {v[0] if isinstance(v, list) and v else v}" for k, v in errors.items()]
+    return normspace("; ".join(p for p in parts if p))[:limit]
+
+
+# ---------- Klien HTTP ----------
+
+class HttpSubmitter:
+    """Satu httpx.AsyncClient (keep-alive, pool sebesar `concurrency`) dengan cookie dari context browser."""
+
+    def __init__(self, shape: SubmitShape | None, edit_url_template: str, cookies: list[dict],
+                 user_agent: str = "", concurrency: int = 8):
+        if httpx is None:
+            raise RuntimeError("--engine http butuh paket httpx: pip install httpx")
+        self.shape = shape
+        self.edit_url_template = edit_url_template
+        jar = httpx.Cookies()
+        for c in cookies:
+            jar.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+        self.client = httpx.AsyncClient(
+            cookies=jar, headers={"User-Agent": user_agent} if user_agent else None, follow_redirects=True,
+            timeout=HTTP_TIMEOUT_S,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency))
+        self.sem = asyncio.Semaphore(concurrency)
+
+    async def fetch_form(self, idsbr: str) -> FormSnapshot:
+        url = self.edit_url_template.replace("{idsbr}", quote(idsbr, safe=""))
+        async with self.sem:
+            resp = await self.client.get(url)
+        if resp.status_code in (401, 403, 419) or LOGIN_URL_RE.search(str(resp.url)):
+            raise SessionExpired(f"GET form dialihkan/ditolak ({resp.status_code} {resp.url})")
+        return FormSnapshot.parse(resp.text)
+
+    async def submit(self, idsbr: str, snap: FormSnapshot, row: ExcelRow) -> tuple[str, str]:
+        """Kirim Submit Final; hasil (outcome, cuplikan respons)."""
+        shape = self.shape
+        pairs = shape.payload(snap, row)
+        headers = dict(shape.headers)
+        if shape.csrf_header == "x-csrf-token" and snap.csrf:
+            headers["x-csrf-token"] = snap.csrf
+        elif shape.csrf_header == "x-xsrf-token" and self.client.cookies.get("XSRF-TOKEN"):
+            headers["x-xsrf-token"] = unquote(self.client.cookies.get("XSRF-TOKEN"))
+        if shape.encoding == "json":
+            content = json.dumps(dict(pairs), ensure_ascii=False).encode("utf-8")
+        else:
+            content = urlencode(pairs).encode("utf-8")
+        async with self.sem:
+            resp = await self.client.request(shape.method, shape.url_for(idsbr), content=content, headers=headers)
+        if LOGIN_URL_RE.search(str(resp.url)):
+            return "SESSION", f"POST dialihkan ke halaman login ({resp.url})"
+        return classify_response(resp.status_code, resp.text), response_detail(resp.text)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,175 @@
+import asyncio
+import sys
+import threading
+import time
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from sbrcore import ExcelRow
+from sbrhttp import (HttpSubmitter, SessionExpired, SubmitShape, classify_response, httpx,
+                     transport_error_code, verify_shape)
+
+# ====== CEK ENGINE HTTP TERHADAP SERVER TIRUAN LOKAL ======
+# Jalankan: python sbrhttp_check.py  (butuh httpx; tidak menyentuh server SBR)
+# Server tiruan menyajikan form edit dan endpoint Submit Final, lalu engine http diuji dari
+# parsing form, bentuk payload, verifikasi shape, sampai klasifikasi respons dan galat transport.
+
+IDSBR = "1234567890"
+FORM_HTML = """<html><head><meta name="csrf-token" content="tok-abc"></head><body><form>
+<input type="hidden" name="_token" value="tok-abc">
+<input type="radio" id="kondisi_aktif" name="kondisi" value="1" checked>
+<input type="radio" id="kondisi_tutup" name="kondisi" value="4">
+<input type="text" id="nomor_telepon" name="nomor_telepon" value="0811">
+<input type="checkbox" id="check-email" name="check_email" value="1" checked>
+<input type="email" id="email" name="email" value="lama@contoh.id">
+<input type="text" id="latitude" name="latitude" value="-6.2">
+<input type="text" id="longitude" name="longitude" value="106.8">
+<input type="text" name="sumber" placeholder="Sumber Profiling" value="">
+<textarea id="catatan_profiling" name="catatan">lama</textarea>
+<input type="text" name="disabled_field" value="x" disabled>
+</form></body></html>"""
+
+# respons Submit Final per mode: (status, body, header tambahan)
+SUBMIT_REPLIES = {
+    "ok": (200, '{"status":"success","message":"Tersimpan"}', {}),
+    "empty": (200, "", {}),
+    "error": (422, '{"message":"Masih terdapat isian yang harus diperbaiki","errors":{"email":["tidak valid"]}}', {}),
+    "html": (200, "<html><button class='btn-success'>Submit Final</button></html>", {}),
+    "noflag": (200, '{"message":"diterima"}', {}),
+    "server": (500, "Internal Server Error", {}),
+    "login": (302, "", {"Location": "/login"}),
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    mode = "ok"
+    posts: list[tuple[dict, dict]] = []
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, body: str = "", headers: dict | None = None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == f"/profiling/edit/{IDSBR}":
+            self.reply(200, FORM_HTML)
+        elif self.path == "/profiling/edit/expired":
+            self.reply(302, "", {"Location": "/login"})
+        else:
+            self.reply(200, "<html>login</html>")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        StubHandler.posts.append((dict(parse_qsl(body, keep_blank_values=True)), dict(self.headers)))
+        if StubHandler.mode == "slow":
+            time.sleep(1.0)    # body sudah diterima, respons terlambat → read timeout di klien
+            self.reply(200, "")
+            return
+        self.reply(*SUBMIT_REPLIES[StubHandler.mode])
+
+
+class Checker:
+    def __init__(self):
+        self.failed = 0
+
+    def check(self, label: str, got, want) -> None:
+        ok = got == want
+        self.failed += not ok
+        print(f"  [{'OK' if ok else 'GAGAL'}] {label}" + ("" if ok else f": dapat {got!r}, harus {want!r}"))
+
+
+async def main() -> int:
+    if httpx is None:
+        print("[ERROR] Cek engine http butuh paket httpx: pip install httpx")
+        return 2
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    c = Checker()
+    row = ExcelRow(index=0, idsbr=IDSBR, nama="Usaha Contoh", status="Tutup", phone="0812-3456",
+                   email="baru@contoh.id", sumber="Telepon", catatan="sudah dihubungi")
+    engine = HttpSubmitter(None, f"{base}/profiling/edit/{{idsbr}}", [], "sbr-check", concurrency=2)
+    try:
+        print("FormSnapshot.parse (GET form):")
+        snap = await engine.fetch_form(IDSBR)
+        c.check("token CSRF dari meta", snap.csrf, "tok-abc")
+        c.check("nilai form", snap.current(), {"status_id": "kondisi_aktif", "phone": "0811",
+                                               "email": "lama@contoh.id", "lat": "-6.2", "lon": "106.8",
+                                               "sumber": "", "catatan": "lama"})
+        c.check("field disabled tidak ikut", "disabled_field" in dict(snap.pairs()), False)
+        try:
+            await engine.fetch_form("expired")
+            c.check("redirect login saat GET form", "tanpa galat", "SessionExpired")
+        except SessionExpired:
+            c.check("redirect login saat GET form", "SessionExpired", "SessionExpired")
+
+        print("SubmitShape.payload / verify_shape:")
+        # payload yang dikirim browser setelah form diisi dari Excel
+        browser_post = {"_token": "tok-abc", "kondisi": "4", "nomor_telepon": "08123456", "check_email": "1",
+                        "email": "baru@contoh.id", "latitude": "-6.2", "longitude": "106.8",
+                        "sumber": "Telepon", "catatan": "sudah dihubungi"}
+        post_data = "&".join(f"{k}={v}" for k, v in browser_post.items())
+        shape = SubmitShape.from_request("post", f"{base}/profiling/submit/{IDSBR}",
+                                         {"Content-Type": "application/x-www-form-urlencoded",
+                                          "X-CSRF-TOKEN": "tok-lama"}, post_data, IDSBR)
+        c.check("URL shape memakai {idsbr}", shape.url, f"{base}/profiling/submit/{{idsbr}}")
+        c.check("shape cocok dengan endpoint IDSBR lain", shape.matches("POST", f"{base}/profiling/submit/99"), True)
+        c.check("shape tidak cocok dengan endpoint lain", shape.matches("POST", f"{base}/profiling/cek/99"), False)
+        c.check("payload = payload browser", dict(shape.payload(snap, row)), browser_post)
+        verify_shape(shape, post_data, snap, row)
+        c.check("verify_shape menerima payload yang sama", True, True)
+        try:
+            verify_shape(shape, post_data.replace("latitude=-6.2", "latitude=-7.0"), snap, row)
+            c.check("verify_shape menolak field yang diisi JavaScript", "lolos", "RuntimeError")
+        except RuntimeError:
+            c.check("verify_shape menolak field yang diisi JavaScript", "RuntimeError", "RuntimeError")
+
+        print("Submit + classify_response:")
+        engine.shape = shape
+        for mode, want in (("ok", "OK"), ("empty", "OK"), ("error", "ERROR_FILL"), ("html", "NO_SUCCESS_SIGNAL"),
+                           ("noflag", "NO_SUCCESS_SIGNAL"), ("server", "HTTP_500"), ("login", "SESSION")):
+            StubHandler.mode = mode
+            result, _ = await engine.submit(IDSBR, snap, row)
+            c.check(f"respons '{mode}'", result, want)
+        form, headers = StubHandler.posts[0]
+        c.check("POST membawa nilai Excel", (form["kondisi"], form["email"], form["catatan"]),
+                ("4", "baru@contoh.id", "sudah dihubungi"))
+        c.check("token CSRF segar di header", headers.get("x-csrf-token") or headers.get("X-CSRF-TOKEN"), "tok-abc")
+        c.check("classify_response 419", classify_response(419, ""), "SESSION")
+        c.check("classify_response Cek Konsistensi", classify_response(200, "Cek Konsistensi"), "KONSISTENSI")
+
+        print("Galat transport:")
+        StubHandler.mode = "slow"
+        engine.client.timeout = httpx.Timeout(0.3)
+        try:
+            await engine.submit(IDSBR, snap, row)
+            c.check("read timeout setelah POST terkirim", "tanpa galat", "NO_SUBMIT_RESPONSE")
+        except httpx.HTTPError as e:
+            c.check("read timeout setelah POST terkirim", transport_error_code(e), "NO_SUBMIT_RESPONSE")
+        # port 9 (discard) tidak listen → koneksi ditolak sebelum request terkirim
+        closed = HttpSubmitter(replace(shape, url="http://127.0.0.1:9/profiling/submit/{idsbr}"),
+                               "http://127.0.0.1:9/{idsbr}", [], concurrency=1)
+        try:
+            await closed.submit(IDSBR, snap, row)
+            c.check("koneksi ditolak", "tanpa galat", "NO_RESPONSE")
+        except httpx.HTTPError as e:
+            c.check("koneksi ditolak", transport_error_code(e), "NO_RESPONSE")
+        finally:
+            await closed.aclose()
+    finally:
+        await engine.aclose()
+        server.shutdown()
+
+    print(f"\nSelesai: {c.failed} cek gagal." if c.failed else "\nSelesai: semua cek lolos.")
+    return 1 if c.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))